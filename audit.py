@@ -0,0 +1,82 @@
+import argparse
+import json
+import pathlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from bot.exts.modes.zen import ZenGame
+from bot.lib import db
+from bot.lib.history import Checkpoint
+from bot.lib.replay import InputLog
+
+parser = argparse.ArgumentParser(
+    formatter_class=argparse.RawTextHelpFormatter,
+    description=(
+        'Replays every recorded zen session in a database and checks that it ends\n'
+        'exactly on what was saved, and that sessions chain into the current save'
+    ),
+    usage='python audit.py [--db path] [--processes int]'
+)
+parser.add_argument('--db', default=db.PATH, metavar='path')
+parser.add_argument('--processes', default=None, type=int, metavar='int')
+
+config = json.load(open('config_defaults.json'))
+
+
+def verify(record: dict) -> Optional[str]:
+    try:
+        depth = record.get('undo_depth', config['undo_depth'])
+        game = ZenGame(record['start'], config | {'undo_depth': depth}, {}, seed=record['seed'])
+        # Long sessions were rehydrated from these, they have to be what replaying got to
+        checkpoints = dict(record.get('checkpoints', []))
+        for count, action in enumerate(InputLog.decode(record['log']), 1):
+            game.apply(action)
+            if count in checkpoints and Checkpoint.take(game).digest() != checkpoints[count]:
+                return f'checkpoint after {count} inputs mismatch'
+    except Exception as e:
+        return f'replay failed: {e!r}'
+
+    save = game.to_save()
+    if save != record['end']:
+        return 'ends on ' + ', '.join(k for k in save if save[k] != record['end'].get(k)) + ' mismatch'
+
+    return None
+
+
+def main():
+    args = parser.parse_args()
+    if not pathlib.Path(args.db).exists():
+        parser.error(f"{args.db} doesn't exist")
+
+    database = db.Database(args.db)
+    replays = list(database.replays)
+    records = [record for _, record in replays]
+    saves = database.zen.all()
+
+    failures = 0
+    with ProcessPoolExecutor(args.processes) as pool:
+        for (replay_id, record), error in zip(replays, pool.map(verify, records, chunksize=64)):
+            if error is not None:
+                failures += 1
+                print(f'#{replay_id} (user {record["user_id"]}): {error}')
+
+    last: dict[int, dict] = {}
+    for replay_id, record in replays:
+        previous = last.get(record['user_id'])
+        if previous is not None and record['start'] != previous['end']:
+            failures += 1
+            print(f'#{replay_id} (user {record["user_id"]}): does not start where the last session ended')
+
+        last[record['user_id']] = record
+
+    for user_id, record in last.items():
+        if saves.get(user_id) != record['end']:
+            failures += 1
+            print(f'user {user_id}: current save differs from the end of the last session')
+
+    print(f'Checked {len(records)} sessions of {len(last)} users, {failures} problems found')
+    raise SystemExit(failures > 0)
+
+
+if __name__ == '__main__':
+    main()
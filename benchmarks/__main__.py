@@ -0,0 +1,243 @@
+"""Times the engine, rendering and map codec on seeded corpora, and gates on a stored baseline
+
+Run with `python -m benchmarks [--filter str] [--repeat int] [--seed int] [--output path]
+[--baseline path] [--threshold float] [--save-baseline]`
+
+Every benchmark is run `--repeat` times, each on a freshly built corpus, and the fastest run is what
+gets compared. Results are written as JSON to `--output`; if `--baseline` exists, anything slower than
+it by more than `--threshold` (a fraction, 0.25 = 25%) is reported and the exit status is 1.
+Timings only compare on the machine that recorded them, so save a baseline before making changes
+"""
+import argparse
+import gc
+import json
+import pathlib
+import platform
+import sys
+import time
+from typing import Callable
+
+import numpy as np
+
+from benchmarks import corpus
+from bot.lib.game import Actions
+from bot.lib.game import Game
+from bot.lib.game import Piece
+from bot.lib.game import Position
+from bot.lib.maps import Encoder
+from bot.lib.search import placements
+
+Setup = Callable[[np.random.Generator], tuple[Callable[[], None], int]]
+
+BENCHMARKS: dict[str, Setup] = {}
+CONFIG = json.load(open('config_defaults.json'))
+SIZE = 256
+
+
+def benchmark(name: str) -> Callable[[Setup], Setup]:
+    """Registers a setup, which builds its corpus and returns what to time and how many ops that does"""
+    def decorator(setup: Setup) -> Setup:
+        BENCHMARKS[name] = setup
+        return setup
+
+    return decorator
+
+
+def make_game(piece: Piece, seed: int) -> Game:
+    game = Game(CONFIG, {}, seed=seed)
+    game.board = piece.board
+    game.current_piece = piece
+    return game
+
+
+def spawned_games(rng: np.random.Generator) -> list[Game]:
+    boards = corpus.boards(SIZE, rng)
+    return [make_game(Piece(board, corpus.piece_type(rng)), i) for i, board in enumerate(boards)]
+
+
+@benchmark('piece.overlaps')
+def bench_overlaps(rng: np.random.Generator):
+    pieces = corpus.resting_pieces(corpus.boards(SIZE, rng), rng)
+    # Half of them pushed into the stack, so both outcomes are covered
+    for piece in pieces[::2]:
+        piece.pos = Position(piece.x + 1, piece.y)
+
+    def run():
+        for piece in pieces:
+            piece.overlaps()
+
+    return run, len(pieces)
+
+
+@benchmark('game.rotate')
+def bench_rotate(rng: np.random.Generator):
+    pieces = corpus.resting_pieces(corpus.boards(SIZE, rng), rng)
+    games = [make_game(piece, i) for i, piece in enumerate(pieces)]
+    turns = rng.choice([-1, +1, 2], len(games)).tolist()
+
+    def run():
+        for game, turn in zip(games, turns):
+            game.rotate(turn)
+
+    return run, len(games)
+
+
+def bench_hard_drop(clear: str) -> Setup:
+    def setup(rng: np.random.Generator):
+        if clear == 'tspin':
+            games = [make_game(corpus.tspin_board(rng), i) for i in range(SIZE)]
+        else:
+            games = [make_game(corpus.well_board(clear, rng), i) for i in range(SIZE)]
+
+        def run():
+            for game in games:
+                game.hard_drop()
+
+        return run, len(games)
+
+    return setup
+
+
+for clear in [*corpus.CLEARS, 'perfect', 'tspin']:
+    benchmark(f'game.hard_drop[{clear}]')(bench_hard_drop(clear))
+
+
+@benchmark('game.get_board_text')
+def bench_board_text(rng: np.random.Generator):
+    games = spawned_games(rng)
+
+    def run():
+        for game in games:
+            game.get_board_text()
+
+    return run, len(games)
+
+
+@benchmark('game.get_board_text[action]')
+def bench_board_text_after_action(rng: np.random.Generator):
+    """What a button press costs to render, the board having been rendered right before the action"""
+    games = spawned_games(rng)
+    actions = rng.choice([Actions.MOVE_LEFT, Actions.MOVE_RIGHT, Actions.ROTATE_CW, Actions.HARD_DROP], SIZE)
+    for game in games:
+        game.get_board_text()
+
+    def run():
+        for game, action in zip(games, actions):
+            game.apply(action)
+            game.get_board_text()
+
+    return run, len(games)
+
+
+@benchmark('game.get_embed')
+def bench_embed(rng: np.random.Generator):
+    games = spawned_games(rng)
+
+    def run():
+        for game in games:
+            game.get_embed()
+
+    return run, len(games)
+
+
+@benchmark('encoder.encode')
+def bench_encode(rng: np.random.Generator):
+    games = spawned_games(rng)
+
+    def run():
+        for game in games:
+            Encoder.encode(game.board, game.current_piece)
+
+    return run, len(games)
+
+
+@benchmark('encoder.decode')
+def bench_decode(rng: np.random.Generator):
+    encoded = [Encoder.encode(game.board, game.current_piece) for game in spawned_games(rng)]
+
+    def run():
+        for data in encoded:
+            Encoder.decode(data)
+
+    return run, len(encoded)
+
+
+@benchmark('search.placements')
+def bench_placements(rng: np.random.Generator):
+    pieces = [game.current_piece for game in spawned_games(rng)[:64]]
+
+    def run():
+        for piece in pieces:
+            placements(piece)
+
+    return run, len(pieces)
+
+
+def measure(setup: Setup, repeat: int, seed: int) -> dict:
+    times = []
+    for _ in range(repeat):
+        func, ops = setup(np.random.default_rng(seed))
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            func()
+            times.append((time.perf_counter() - start) / ops * 1e6)
+        finally:
+            gc.enable()
+
+    return {'best_us': min(times), 'median_us': float(np.median(times)), 'ops': ops}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--filter', default='', metavar='str', help='only run benchmarks containing this')
+    parser.add_argument('--repeat', default=5, type=int, metavar='int')
+    parser.add_argument('--seed', default=0, type=int, metavar='int')
+    parser.add_argument('--output', default='benchmarks/results.json', type=pathlib.Path, metavar='path')
+    parser.add_argument('--baseline', default='benchmarks/baseline.json', type=pathlib.Path, metavar='path')
+    parser.add_argument('--threshold', default=0.25, type=float, metavar='float')
+    parser.add_argument('--save-baseline', action='store_true', help='also write the results to --baseline')
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.baseline.exists() and not args.save_baseline:
+        baseline = json.loads(args.baseline.read_text())['results']
+
+    results = {}
+    regressions = []
+    print(f'{"benchmark":<28}{"best":>12}{"median":>12}{"baseline":>12}{"change":>10}')
+    for name, setup in BENCHMARKS.items():
+        if args.filter not in name:
+            continue
+
+        result = results[name] = measure(setup, args.repeat, args.seed)
+        line = f'{name:<28}{result["best_us"]:>10.2f}µs{result["median_us"]:>10.2f}µs'
+        if name in baseline:
+            change = result['best_us'] / baseline[name]['best_us'] - 1
+            line += f'{baseline[name]["best_us"]:>10.2f}µs{change:>+10.1%}'
+            if change > args.threshold:
+                regressions.append(name)
+                line += '  REGRESSED'
+
+        print(line)
+
+    report = {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'seed': args.seed,
+        'repeat': args.repeat,
+        'threshold': args.threshold,
+        'regressions': regressions,
+        'results': results
+    }
+    args.output.write_text(json.dumps(report, indent=4))
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(report, indent=4))
+
+    if regressions:
+        print(f'Regressed more than {args.threshold:.0%}: {", ".join(regressions)}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Reproducible boards and pieces for the benchmarks, everything is drawn from a seeded generator"""
+import numpy as np
+from numpy.typing import NDArray
+
+from bot.lib.game import Frame
+from bot.lib.game import Piece
+from bot.lib.game import Pieces
+
+# Lines cleared by a vertical I dropped into the well of `well_board`
+CLEARS = {'none': 0, 'single': 1, 'double': 2, 'triple': 3, 'tetris': 4}
+
+
+def punch_holes(board: NDArray[np.int8], rng: np.random.Generator):
+    """Empties one random cell of every full row"""
+    full = np.flatnonzero(board.all(1))
+    board[full, rng.integers(0, 10, len(full))] = 0
+
+
+def stack(height: int, rng: np.random.Generator) -> NDArray[np.int8]:
+    """A 30x10 board with an uneven stack of up to `height` rows, some holes, and no full rows"""
+    board = np.zeros((30, 10), dtype=np.int8)
+    for col, h in enumerate(rng.integers(0, height + 1, 10)):
+        board[30 - h:, col] = rng.integers(1, 8, h)
+
+    board[rng.random((30, 10)) < 0.08] = 0
+    punch_holes(board, rng)
+    return board
+
+
+def boards(count: int, rng: np.random.Generator, height: int = 12) -> list[NDArray[np.int8]]:
+    return [stack(height, rng) for _ in range(count)]
+
+
+def piece_type(rng: np.random.Generator) -> int:
+    """A random piece type, from 1 since 0 is an empty cell"""
+    piece_type = int(rng.integers(1, 8))
+    assert Pieces(piece_type)
+    return piece_type
+
+
+def resting_pieces(boards: list[NDArray[np.int8]], rng: np.random.Generator) -> list[Piece]:
+    """A random piece hard dropped onto each board, which is where most rotations need kicks"""
+    pieces = []
+    for board in boards:
+        piece = Piece(board, piece_type(rng), y=int(rng.integers(0, 7)), r=int(rng.integers(0, 4)))
+        piece.x += 30
+        pieces.append(piece)
+
+    return pieces
+
+
+def well_board(clear: str, rng: np.random.Generator) -> Piece:
+    """A stack with a 4-deep well and a vertical I above it that clears `CLEARS[clear]` lines
+
+    `perfect` is a tetris with nothing else on the board
+    """
+    col = int(rng.integers(0, 10))
+    if clear == 'perfect':
+        board = np.zeros((30, 10), dtype=np.int8)
+        board[26:] = rng.integers(1, 8, (4, 10))
+    else:
+        board = stack(12, rng)
+        board[26:] = rng.integers(1, 8, (4, 10))
+        # Keep everything that shouldn't clear from doing so
+        for row in range(26, 30 - CLEARS[clear]):
+            board[row, (col + int(rng.integers(1, 10))) % 10] = 0
+
+    board[:, col] = 0
+    return Piece(board, Pieces.I.value, y=col - 2, r=1)
+
+
+def tspin_board(rng: np.random.Generator) -> Piece:
+    """A T-spin double slot with a T already spun into it"""
+    y = int(rng.integers(0, 8))
+    board = stack(6, rng)
+    board[27:] = rng.integers(1, 8, (3, 10))
+    board[27, y + 1:y + 3] = 0
+    board[28, y:y + 3] = 0
+    board[29, y + 1] = 0
+    board[:27, y + 1:y + 3] = 0
+
+    piece = Piece(board, Pieces.T.value, 27, y, 2)
+    # Pretend it got here by rotating, which is what makes it count as a spin
+    piece.delta = Frame(27, y, 1) + piece.frame
+    return piece
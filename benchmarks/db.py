@@ -0,0 +1,119 @@
+"""Measures per-user lookups and saves against a database of many users, and the db.json it replaced
+
+Run with `python -m benchmarks.db [--users int] [--ops int] [--json-ops int]`
+
+Both are filled with the same settings and zen saves in a temporary directory first. Every op is
+timed on its own, on a random user, and the median and 99th percentile are printed. Writes to SQLite
+only take as long as queueing them, so how long the writer then takes to commit them all is printed
+too. db.json is as the bot used to keep it: cached writes flushed every 16, and queries scanning
+every document
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import tempfile
+import time
+from typing import Callable
+
+from tinydb import TinyDB
+from tinydb import where
+from tinydb.middlewares import CachingMiddleware
+from tinydb.storages import JSONStorage
+
+from bot.exts.modes.zen import ZenGame
+from bot.lib import db
+
+CONFIG = json.load(open('config_defaults.json'))
+
+
+def fake_save(rng: random.Random) -> dict:
+    return ZenGame({}, CONFIG, {}, seed=rng.randrange(2**32)).to_save() | {'score': rng.randrange(10**6)}
+
+
+def timed(op: Callable[[int], None], users: int, count: int, rng: random.Random) -> list[float]:
+    times = []
+    for _ in range(count):
+        user_id = rng.randrange(users)
+        start = time.perf_counter()
+        op(user_id)
+        times.append(time.perf_counter() - start)
+
+    return times
+
+
+def report(name: str, times: list[float]):
+    times.sort()
+    print(
+        f'{name:<28}{statistics.median(times) * 1e6:>12,.1f}µs'
+        f'{times[int(len(times) * 0.99)] * 1e6:>12,.1f}µs{len(times):>8}'
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', default=100_000, type=int, metavar='int')
+    parser.add_argument('--ops', default=5000, type=int, metavar='int')
+    parser.add_argument('--json-ops', default=50, type=int, metavar='int', help='ops on db.json, far slower')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    templates = [fake_save(rng) for _ in range(64)]
+    settings = [(i, {'skin': rng.randrange(3), 'controls': rng.randrange(3)}) for i in range(args.users)]
+    saves = [(i, rng.choice(templates) | {'score': rng.randrange(10**6)}) for i in range(args.users)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = db.Database(f'{tmp}/db.sqlite3')
+        for user_id, user_settings in settings:
+            for name, value in user_settings.items():
+                database.settings.set(user_id, name, value)
+        database.zen.save_all(saves)
+        asyncio.run(database.flush())
+
+        print(f'{args.users:,} users, {database.size() / 1024 / 1024:.1f} MiB in SQLite')
+        print(f'{"op":<28}{"median":>14}{"p99":>14}{"ops":>8}')
+        board = database.leaderboard
+        last = args.users - 15
+        for name, op, count in [
+            ('settings.get', database.settings.get, args.ops),
+            ('settings.get[cached]', lambda i: database.settings.get(i % 1000), args.ops),
+            ('settings.set', lambda i: database.settings.set(i, 'skin', 1), args.ops),
+            ('zen.get', database.zen.get, args.ops),
+            ('zen.save', lambda i: database.zen.save(i, saves[i][1]), args.ops),
+            ('leaderboard.modes', lambda _: board.modes(), args.ops // 10),
+            ('leaderboard.top', lambda _: board.top('zen', 0, 15), args.ops),
+            ('leaderboard.top[last]', lambda _: board.top('zen', last, args.users), args.ops // 10),
+            ('leaderboard.median', lambda _: board.median('zen'), args.ops // 10),
+        ]:  # yapf: disable
+            report(name, timed(op, args.users, count, rng))
+
+        start = time.perf_counter()
+        asyncio.run(database.flush())
+        print(f'Then committed the rest in {time.perf_counter() - start:.3f}s, {database.writer.stats()}')
+        database.close()
+
+        with open(f'{tmp}/db.json', 'w') as fp:
+            json.dump({
+                'settings': {str(i + 1): {'user_id': i} | s for i, s in settings},
+                'zen': {str(i + 1): {'user_id': i} | s for i, s in saves}
+            }, fp)  # yapf: disable
+
+        storage = CachingMiddleware(JSONStorage)
+        storage.WRITE_CACHE_SIZE = 16
+        old = TinyDB(f'{tmp}/db.json', storage=storage)
+        settings_table, zen_table = old.table('settings'), old.table('zen')
+        for name, op in [
+            ('db.json settings.get', lambda i: settings_table.get(where('user_id') == i)),
+            ('db.json settings.set', lambda i: settings_table.upsert({'skin': 1}, where('user_id') == i)),
+            ('db.json zen.get', lambda i: zen_table.get(where('user_id') == i)),
+            ('db.json zen.save', lambda i: zen_table.upsert(
+                {'user_id': i} | saves[i][1], where('user_id') == i
+            ))
+        ]:  # yapf: disable
+            report(name, timed(op, args.users, args.json_ops, rng))
+        old.close()
+
+
+if __name__ == '__main__':
+    main()
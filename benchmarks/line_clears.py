@@ -0,0 +1,70 @@
+"""Compares line clearing before and after `BitBoard.clear_lines`, for 0 to 4 cleared rows
+
+Run with `python -m benchmarks.line_clears [--number int]`
+"""
+import argparse
+import time
+
+import numpy as np
+from numpy.typing import NDArray
+
+from bot.lib.game import BitBoard
+
+
+def old_clear_lines(board: NDArray[np.int8]) -> tuple[NDArray[np.int8], int]:
+    # What `Game.lock_piece` used to do, one roll and concatenate per cleared row
+    line_clears = 0
+    for row, clear in enumerate(board.all(1)):
+        if clear:
+            board[row] = 0
+            board = np.concatenate((np.roll(board[:row + 1], shift=1, axis=0), board[row + 1:]))
+            line_clears += 1
+
+    return board, line_clears
+
+
+def make_board(lines: int, rng: np.random.Generator) -> NDArray[np.int8]:
+    board = np.zeros((30, 10), dtype=np.int8)
+    board[20:] = rng.integers(1, 8, (10, 10))
+    # Punch one hole in every row that shouldn't be cleared
+    for row in rng.choice(np.arange(20, 30), 10 - lines, replace=False):
+        board[row, rng.integers(10)] = 0
+
+    return board
+
+
+def bench(lines: int, number: int) -> tuple[float, float]:
+    rng = np.random.default_rng(lines)
+    boards = [make_board(lines, rng) for _ in range(number)]
+
+    old_boards = [i.copy() for i in boards]
+    start = time.perf_counter()
+    for board in old_boards:
+        old_clear_lines(board)
+    old = time.perf_counter() - start
+
+    new_boards = [BitBoard(i.copy()) for i in boards]
+    start = time.perf_counter()
+    for board in new_boards:
+        board.clear_lines()
+    new = time.perf_counter() - start
+
+    for board, new_board in zip(boards, new_boards):
+        assert (old_clear_lines(board)[0] == new_board.cells).all()
+
+    return old / number, new / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', default=10000, type=int, metavar='int')
+    args = parser.parse_args()
+
+    print(f'{"lines":>5} {"old":>10} {"new":>10} {"speedup":>8}')
+    for lines in range(5):
+        old, new = bench(lines, args.number)
+        print(f'{lines:>5} {old * 1e6:>8.2f}us {new * 1e6:>8.2f}us {old / new:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
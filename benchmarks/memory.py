@@ -0,0 +1,141 @@
+"""Measures memory held per game and piece, and allocated per action, with tracemalloc
+
+Run with `python -m benchmarks.memory [--games int] [--actions int]`
+
+Per action is the peak traced memory while playing it above what was traced right before, so it
+counts everything an action allocates even if it's freed right after. Games are also played for
+`--actions` actions after warming up, and must not be holding more by the end. Anything over its
+bound is reported and the exit status is 1
+"""
+import argparse
+import gc
+import json
+import random
+import sys
+import tracemalloc
+
+from bot.exts.modes.zen import ZenGame
+from bot.lib.game import Actions
+from bot.lib.game import BitBoard
+from bot.lib.game import Game
+from bot.lib.game import Piece
+from bot.lib.history import Snapshot
+
+CONFIG = json.load(open('config_defaults.json'))
+MOVES = [
+    Actions.MOVE_LEFT, Actions.MOVE_RIGHT, Actions.CHARGE_LEFT, Actions.CHARGE_RIGHT, Actions.ROTATE_CW,
+    Actions.ROTATE_CCW, Actions.ROTATE_180, Actions.SOFT_DROP
+]
+
+# Bytes held, about half again what they took when these were set so they hold across Python versions
+HELD_BOUNDS = {'Game': 7500, 'Moved piece': 160, 'Snapshot': 720}
+# Bytes allocated per action, hard drops also lock the piece and spawn the next one
+ACTION_BOUNDS = {'HARD_DROP': 1440}
+ACTION_BOUND = 256
+# What a game holds varies a bit with its board, queue and undo history, but a leak of a few bytes
+# an action adds up to more than this over the default `--actions`
+GROWTH_BOUND = 64 * 1024
+WARM_UP = 2000
+
+
+def held(factory, count: int) -> float:
+    """Bytes still traced per object after making `count` of them"""
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+    objects = [factory(i) for i in range(count)]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    return (current - start) / count
+
+
+def moved_piece(board: BitBoard, t: int) -> Piece:
+    piece = Piece(board, t)
+    piece.rot += 1
+    piece.y -= 1
+    return piece
+
+
+def played_game(actions: list[Actions]) -> Game:
+    game = Game(CONFIG, {}, seed=0)
+    for action in actions:
+        game.apply(action)
+
+    return game
+
+
+def per_action(actions: list[Actions]) -> dict[str, float]:
+    game = Game(CONFIG, {}, seed=0)
+    totals = {action.name: [0, 0] for action in set(actions)}
+    tracemalloc.start()
+    for action in actions:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        game.apply(action)
+        _, peak = tracemalloc.get_traced_memory()
+        totals[action.name][0] += peak - before
+        totals[action.name][1] += 1
+
+    tracemalloc.stop()
+    return {name: total / count for name, (total, count) in sorted(totals.items())}
+
+
+def growth(game: Game, warm_up: list[Actions], actions: list[Actions]) -> int:
+    """Bytes `game` holds after playing `actions` on top of what it held after `warm_up`"""
+    for action in warm_up:
+        game.apply(action)
+
+    gc.collect()
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+    for action in actions:
+        game.apply(action)
+
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--games', default=1000, type=int, metavar='int')
+    parser.add_argument('--actions', default=20000, type=int, metavar='int')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    actions = [rng.choice(MOVES + [Actions.HARD_DROP]) for _ in range(args.actions)]
+
+    over = []
+    board = BitBoard()
+    game = played_game(actions[:500])
+    for name, factory in [
+        ('Game', lambda i: Game(CONFIG, {}, seed=i)),
+        ('Moved piece', lambda i: moved_piece(board, i % 7 + 1)),
+        ('Snapshot', lambda i: Snapshot.take(game)),
+    ]:  # yapf: disable
+        size = held(factory, args.games)
+        print(f'{name + ":":<13}{size:>8,.0f} bytes held, at most {HELD_BOUNDS[name]:,}')
+        if size > HELD_BOUNDS[name]:
+            over.append(name)
+
+    for name, size in per_action(actions).items():
+        bound = ACTION_BOUNDS.get(name, ACTION_BOUND)
+        print(f'{name:<13}{size:>8,.0f} bytes allocated, at most {bound:,}')
+        if size > bound:
+            over.append(name)
+
+    for game in [Game(CONFIG, {}, seed=0), ZenGame({}, CONFIG, {}, seed=0)]:
+        name = type(game).__name__
+        size = growth(game, actions[:WARM_UP], actions)
+        print(f'{name + ":":<13}{size:>8,} bytes more held after the actions, at most {GROWTH_BOUND:,}')
+        if size > GROWTH_BOUND:
+            over.append(f'{name} growth')
+
+    if over:
+        print(f'Over their bound: {", ".join(over)}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
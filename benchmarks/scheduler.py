@@ -0,0 +1,159 @@
+"""Runs the edit scheduler against a local fake of the API, and checks every game ends up shown
+
+Run with `python -m benchmarks.scheduler [--games int] [--channels int] [--seconds float]
+[--rate float] [--port int]`
+
+The fake keeps a bucket per channel like the API does, answering with a JSON 429 once it's used up,
+and also answers some edits with a 429 that has no body (like the HTML ones from Cloudflare), one
+with only a Retry-After header, a 500, or a body that isn't the JSON it says it is. Games are played
+at `--rate` presses a second for `--seconds`, then given time to catch up. Any game whose message
+doesn't end on its last frame, a bucket the scheduler went over more than once per channel, or an
+exception nobody saw is reported and the exit status is 1
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+import types
+
+from aiohttp import web
+
+from bot.lib.scheduler import EditScheduler
+
+LIMIT = 5
+PERIOD = 1.0
+# Of every edit, the ones answered with each kind of failure instead
+FAILURES = {'no body': 0.05, 'retry after': 0.05, 'error': 0.02, 'bad json': 0.02}
+
+
+def failed(name: str) -> web.Response:
+    if name == 'no body':
+        return web.Response(status=429, text='<html>429</html>', content_type='text/html')
+    if name == 'retry after':
+        return web.Response(status=429, headers={'Retry-After': '0.2'})
+    if name == 'error':
+        return web.Response(status=500, text='{}', content_type='application/json')
+
+    return web.Response(status=200, text='<html>', content_type='application/json')
+
+
+class FakeAPI:
+    """Message edits with per-channel buckets, and failures as often as `FAILURES` says"""
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+        self.buckets: dict[int, tuple[float, int]] = {}
+        self.shown: dict[int, str] = {}
+        self.counts = {'edits': 0, 'over bucket': 0} | {name: 0 for name in FAILURES}
+
+    async def edit(self, request: web.Request) -> web.Response:
+        channel_id, message_id = int(request.match_info['channel']), int(request.match_info['message'])
+        payload = await request.json()
+        now = time.monotonic()
+        failure = self.rng.random()
+        for name, chance in FAILURES.items():
+            if failure < chance:
+                self.counts[name] += 1
+                return failed(name)
+            failure -= chance
+
+        reset_at, used = self.buckets.get(channel_id, (now + PERIOD, 0))
+        if now >= reset_at:
+            reset_at, used = now + PERIOD, 0
+        headers = {'X-RateLimit-Limit': str(LIMIT), 'X-RateLimit-Reset-After': f'{reset_at - now:.3f}'}
+        if used >= LIMIT:
+            self.counts['over bucket'] += 1
+            body = {'message': 'You are being rate limited.', 'retry_after': reset_at - now, 'global': False}
+            return web.json_response(body, status=429, headers=headers | {'X-RateLimit-Remaining': '0'})
+
+        self.buckets[channel_id] = reset_at, used + 1
+        self.counts['edits'] += 1
+        self.shown[message_id] = payload['content']
+        headers['X-RateLimit-Remaining'] = str(LIMIT - used - 1)
+        return web.json_response({'id': str(message_id)}, headers=headers)
+
+
+class FakeSession:
+    """Just what the scheduler uses of a session, its frames are how many presses it's had"""
+    def __init__(self, channel_id: int, message_id: int):
+        self.channel_id = channel_id
+        self.message_id = message_id
+        self.lock = asyncio.Lock()
+        self.closed = False
+        self.presses = 0
+        self._shown = -1
+
+    def frame(self) -> dict:
+        if self.presses == self._shown:
+            return None
+
+        self._shown = self.presses
+        return {'content': str(self.presses)}
+
+    def sent(self, payload: dict):
+        if payload is None:
+            self._shown = -1
+
+
+async def run(args: argparse.Namespace) -> list[str]:
+    rng = random.Random(0)
+    api = FakeAPI(rng)
+    app = web.Application()
+    app.router.add_patch('/api/channels/{channel}/messages/{message}', api.edit)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', args.port).start()
+
+    unseen = []
+    asyncio.get_running_loop().set_exception_handler(lambda loop, context: unseen.append(context))
+    config = {'api_base': f'http://127.0.0.1:{args.port}/api', 'edit_window': 0.3}
+    bot = types.SimpleNamespace(config=config, http=types.SimpleNamespace(token='token'))
+    scheduler = EditScheduler(bot)
+    sessions = [FakeSession(i % args.channels, i) for i in range(args.games)]
+    for session in sessions:
+        scheduler.submit(session)
+
+    end = time.monotonic() + args.seconds
+    while time.monotonic() < end:
+        session = rng.choice(sessions)
+        session.presses += 1
+        scheduler.submit(session)
+        await asyncio.sleep(1 / args.rate)
+
+    # Every channel's games get a bucket's worth of edits a period, failures aside
+    await asyncio.sleep(args.games / args.channels / LIMIT * PERIOD * 2 + 2)
+    stats = scheduler.stats()
+    await scheduler.close()
+    await runner.cleanup()
+
+    print(f'Scheduler: {stats}')
+    print(f'Fake API:  {api.counts}')
+    problems = []
+    behind = [session for session in sessions if api.shown.get(session.message_id) != str(session.presses)]
+    if behind:
+        problems.append(f'{len(behind)} games not showing their last frame')
+    if api.counts['over bucket'] > args.channels:
+        problems.append(f'went over a bucket {api.counts["over bucket"]} times')
+    if unseen:
+        problems.append(f'{len(unseen)} exceptions nobody saw')
+
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--games', default=100, type=int, metavar='int')
+    parser.add_argument('--channels', default=10, type=int, metavar='int')
+    parser.add_argument('--seconds', default=10.0, type=float, metavar='float')
+    parser.add_argument('--rate', default=30.0, type=float, metavar='float', help='presses a second')
+    parser.add_argument('--port', default=8765, type=int, metavar='int')
+    args = parser.parse_args()
+
+    problems = asyncio.run(run(args))
+    if problems:
+        print(f'Problems: {", ".join(problems)}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
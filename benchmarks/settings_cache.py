@@ -0,0 +1,91 @@
+"""Checks the settings cache never serves stale settings, and isn't emptied by the bot's own writes
+
+Run with `python -m benchmarks.settings_cache [--users int]`
+
+Settings of `--users` users are cached, then changed by the bot itself, by another connection, by
+another process and by another connection emptying the table, and read back after each. Anything
+read that isn't what was last written is reported and the exit status is 1
+"""
+import argparse
+import asyncio
+import sqlite3
+import subprocess
+import sys
+import tempfile
+
+from bot.lib import db
+
+# Longer than the writer takes to notice another process has committed
+SETTLE = db.CHECK_EVERY * 3
+
+OTHER_PROCESS = """
+import sys
+from bot.lib import db
+database = db.Database(sys.argv[1])
+for user_id in range(int(sys.argv[2])):
+    database.settings.set(user_id, 'skin', 2)
+database.close()
+"""
+
+
+def stale(database: db.Database, expected: dict[int, dict[str, int]]) -> list[int]:
+    """The users whose settings aren't read as `expected`"""
+    return [user_id for user_id, settings in expected.items() if database.settings.get(user_id) != settings]
+
+
+async def check(path: str, users: int) -> list[str]:
+    database = db.Database(path)
+    problems = []
+
+    def expect(name: str, expected: dict[int, dict[str, int]]):
+        wrong = stale(database, expected)
+        print(f'{name:<28}{len(wrong):>8} stale of {len(expected)}')
+        if wrong:
+            problems.append(name)
+
+    for user_id in range(users):
+        database.settings.set(user_id, 'skin', 1)
+    expect('own writes', {user_id: {'skin': 1} for user_id in range(users)})
+    await database.flush()
+    await asyncio.sleep(SETTLE)
+    misses = database.settings.cache_info().misses
+    expect('own writes committed', {user_id: {'skin': 1} for user_id in range(users)})
+    if database.settings.cache_info().misses != misses:
+        print('Own commits emptied the cache')
+        problems.append('own commits')
+
+    other = sqlite3.connect(path)
+    other.execute("UPDATE settings SET data = json_set(data, '$.controls', 1)")
+    other.commit()
+    await asyncio.sleep(SETTLE)
+    expect('another connection', {user_id: {'skin': 1, 'controls': 1} for user_id in range(users)})
+
+    subprocess.run([sys.executable, '-c', OTHER_PROCESS, path, str(users)], check=True)
+    await asyncio.sleep(SETTLE)
+    expect('another process', {user_id: {'skin': 2, 'controls': 1} for user_id in range(users)})
+
+    other.execute('DELETE FROM settings')
+    other.commit()
+    other.close()
+    await asyncio.sleep(SETTLE)
+    expect('truncated', {user_id: {} for user_id in range(users)})
+
+    database.close()
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', default=1000, type=int, metavar='int')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        problems = asyncio.run(check(f'{tmp}/db.sqlite3', args.users))
+
+    if problems:
+        print(f'Stale or uncached: {", ".join(problems)}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""Compares placements per second of `VectorGame` against looping over `Game` instances
+
+Run with `python -m benchmarks.vector_game [--games int] [--placements int]`
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from bot.lib import game
+from bot.lib.vector import Actions
+from bot.lib.vector import VectorGame
+
+ROTATIONS = [Actions.NONE, Actions.ROTATE_CW, Actions.ROTATE_CCW, Actions.ROTATE_180]
+MOVES = [Actions.NONE, Actions.MOVE_LEFT, Actions.MOVE_RIGHT, Actions.CHARGE_LEFT, Actions.CHARGE_RIGHT]
+METHODS = {
+    Actions.NONE: lambda g: None,
+    Actions.ROTATE_CW: lambda g: g.rotate(+1),
+    Actions.ROTATE_CCW: lambda g: g.rotate(-1),
+    Actions.ROTATE_180: lambda g: g.rotate(2),
+    Actions.MOVE_LEFT: lambda g: g.drag(-1),
+    Actions.MOVE_RIGHT: lambda g: g.drag(+1),
+    Actions.CHARGE_LEFT: lambda g: g.drag(-10),
+    Actions.CHARGE_RIGHT: lambda g: g.drag(+10),
+}
+
+
+def bench_games(n: int, placements: int, rng: np.random.Generator) -> float:
+    config = json.load(open('config_defaults.json'))
+    games = [game.Game(config, {}, seed=seed) for seed in range(n)]
+    rotations = rng.choice(ROTATIONS, (placements, n))
+    moves = rng.choice(MOVES, (placements, n))
+
+    start = time.perf_counter()
+    for i in range(placements):
+        for g, rotation, move in zip(games, rotations[i], moves[i]):
+            METHODS[rotation](g)
+            METHODS[move](g)
+            g.hard_drop()
+
+    return n * placements / (time.perf_counter() - start)
+
+
+def bench_vector(n: int, placements: int, rng: np.random.Generator) -> float:
+    games = VectorGame(n, seed=0)
+    rotations = rng.choice(ROTATIONS, (placements, n))
+    moves = rng.choice(MOVES, (placements, n))
+
+    start = time.perf_counter()
+    for i in range(placements):
+        games.step(rotations[i])
+        games.step(moves[i])
+        games.step(Actions.HARD_DROP)
+
+    return n * placements / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--games', default=4096, type=int, metavar='int')
+    parser.add_argument('--placements', default=50, type=int, metavar='int')
+    args = parser.parse_args()
+
+    looped = bench_games(args.games, args.placements, np.random.default_rng(0))
+    vector = bench_vector(args.games, args.placements, np.random.default_rng(0))
+    print(f'Game:       {looped:>12,.0f} placements/s')
+    print(f'VectorGame: {vector:>12,.0f} placements/s ({vector / looped:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
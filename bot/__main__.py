@@ -5,24 +5,41 @@ import traceback
 
 import discord
 from discord.ext import commands
-from tinydb import TinyDB
-from tinydb.middlewares import CachingMiddleware
-from tinydb.storages import JSONStorage
 
 from bot import exts
+from bot.cluster import Assignment
+from bot.lib import db
+from bot.lib import skins
+from bot.lib.lag import LagMonitor
+from bot.lib.offload import Offload
+from bot.lib.scheduler import EditScheduler
+from bot.lib.session import Sessions
 
 
-class TetrisBot(commands.Bot):
+class TetrisBot(commands.AutoShardedBot):
     def __init__(self):
         config_path = pathlib.Path('config.json')
         if not config_path.exists():
             open('config.json', 'w').write(open('config_defaults.json').read())
 
-        self.config = json.load(open('config_defaults.json')) | json.load(open('config.json'))
-        storage = CachingMiddleware(JSONStorage)
-        # TEMP: This isn't ideal; maybe a time-based subclass instead?
-        storage.WRITE_CACHE_SIZE = 16  # (also, the default is insanely big for this; 1000 ops)
-        self.db = TinyDB('db.json', storage=storage)
+        self.load_config()
+        if pathlib.Path('db.json').exists() and not pathlib.Path(db.PATH).exists():
+            raise SystemExit(
+                'Found db.json from an older version, run `python migrate.py` to move it over first'
+            )
+
+        self.db = db.Database()
+        # Set when this is one of the workers of `bot.cluster`, which share the db
+        self.cluster = Assignment.from_env()
+        if self.cluster is None:
+            shards = {'shard_count': 1}
+        else:
+            shards = {'shard_ids': self.cluster.shard_ids, 'shard_count': self.cluster.shard_count}
+
+        self.scheduler = EditScheduler(self)
+        self.sessions = Sessions(self)
+        self.offload = Offload()
+        self.lag = LagMonitor(debug=self.config['loop_debug'])
 
         super().__init__(
             allowed_mentions=discord.AllowedMentions(
@@ -31,7 +48,8 @@ class TetrisBot(commands.Bot):
             command_prefix=commands.when_mentioned_or(self.config['prefix']),
             case_insensitive=True,
             activity=discord.Game('Loading...'),
-            status=discord.Status.dnd
+            status=discord.Status.dnd,
+            **shards
         )
 
         self.load_extension('yade')
@@ -49,8 +67,25 @@ class TetrisBot(commands.Bot):
             except commands.ExtensionError:
                 traceback.print_exc()
 
+    def load_config(self):
+        """(Re)loads the config and compiles its skins, running games pick up the new skins on their
+        next render"""
+        self.config = json.load(open('config_defaults.json')) | json.load(open('config.json'))
+        # The stand-in (see `bot.cluster.standin`) is swapped in for the API and gateway through this
+        discord.http.Route.BASE = self.config['api_base']
+        skins.load(self.config)
+
+    async def start(self, *args, **kwargs):
+        self.lag.start()
+        await super().start(*args, **kwargs)
+
     async def close(self):
+        self.lag.stop()
+        self.offload.shutdown()
+        await self.scheduler.close()
         await super().close()
+        self.sessions.evict()
+        await self.db.flush()
         self.db.close()
 
 
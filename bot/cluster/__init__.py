@@ -0,0 +1,35 @@
+"""Running the bot as several worker processes, each connected to its own share of the gateway's shards
+
+`python -m bot.cluster` starts and supervises the workers (see `__main__`). Each one is told what
+it's running through the `TETRIS_CLUSTER` environment variable and reports its health back through
+a pipe every `HEARTBEAT` seconds, as a line of JSON
+"""
+import json
+import os
+from typing import Optional
+
+ENV = 'TETRIS_CLUSTER'
+HEARTBEAT = 15
+
+
+class Assignment:
+    """What a worker runs: `shard_ids` out of `shard_count` shards"""
+    __slots__ = ('worker', 'shard_ids', 'shard_count', 'health_fd')
+
+    def __init__(self, worker: int, shard_ids: list[int], shard_count: int, health_fd: int):
+        self.worker = worker
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.health_fd = health_fd
+
+    @staticmethod
+    def from_env() -> Optional['Assignment']:
+        """This process' assignment, None if it isn't run by a cluster"""
+        value = os.environ.get(ENV)
+        return None if value is None else Assignment(**json.loads(value))
+
+    def to_env(self) -> dict[str, str]:
+        return {ENV: json.dumps({name: getattr(self, name) for name in self.__slots__})}
+
+    def report(self, health: dict):
+        os.write(self.health_fd, json.dumps(health).encode() + b'\n')
@@ -0,0 +1,169 @@
+"""Runs the bot as the config's `cluster.workers` processes, splitting the gateway's shards between them
+
+Run with `python -m bot.cluster`. `cluster.shards` is how many shards there are in total, or null to
+use as many as Discord recommends. Workers that exit are started again, after a delay that doubles
+each time one exits before running for `STABLE` seconds, and ones that stop reporting their health
+(e.g. with a blocked event loop) are killed and restarted too. Every minute, the health of all of
+them is printed, and SIGINT or SIGTERM stop them all
+"""
+import asyncio
+import datetime
+import json
+import math
+import os
+import signal
+import sys
+import time
+from typing import Optional
+
+import aiohttp
+
+from bot.cluster import Assignment
+from bot.cluster import HEARTBEAT
+
+# Workers that haven't reported their health for this long are killed
+SILENT_FOR = 4 * HEARTBEAT
+STABLE = 60
+MIN_DELAY = 1
+MAX_DELAY = 60
+SUMMARY_EVERY = 60
+
+
+def log(message: str):
+    print(f'[{datetime.datetime.now():%Y-%m-%d %H:%M:%S}] {message}', flush=True)
+
+
+class Worker:
+    """A worker process, started again whenever it exits until the cluster's stopped"""
+    def __init__(self, index: int, shard_ids: list[int], shard_count: int):
+        self.index = index
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.health: Optional[dict] = None
+        self.started_at = 0.0
+        self.reported_at = 0.0
+        self.restarts = 0
+        self.stopping = False
+
+    async def run(self):
+        delay = MIN_DELAY
+        while not self.stopping:
+            read_fd, write_fd = os.pipe()
+            assignment = Assignment(self.index, self.shard_ids, self.shard_count, write_fd)
+            self.process = await asyncio.create_subprocess_exec(
+                sys.executable, '-m', 'bot', env=os.environ | assignment.to_env(), pass_fds=(write_fd,)
+            )
+            os.close(write_fd)
+            self.health = None
+            self.started_at = self.reported_at = time.monotonic()
+            log(f'worker {self.index} started (pid {self.process.pid}, shards {self.shard_ids})')
+
+            reader = asyncio.create_task(self._read_health(read_fd))
+            watchdog = asyncio.create_task(self._watch())
+            code = await self.process.wait()
+            reader.cancel()
+            watchdog.cancel()
+            if self.stopping:
+                break
+
+            if time.monotonic() - self.started_at >= STABLE:
+                delay = MIN_DELAY
+            # Exiting cleanly is how workers ask to be restarted (e.g. by `doupdate`)
+            wait = 0 if code == 0 else delay
+            log(f'worker {self.index} exited with code {code}, restarting in {wait}s')
+            await asyncio.sleep(wait)
+            if code != 0:
+                delay = min(delay * 2, MAX_DELAY)
+            self.restarts += 1
+
+    def stop(self):
+        self.stopping = True
+        if self.process is not None and self.process.returncode is None:
+            self.process.terminate()
+
+    async def _read_health(self, fd: int):
+        reader = asyncio.StreamReader()
+        loop = asyncio.get_running_loop()
+        transport, _ = await loop.connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(reader), os.fdopen(fd, 'rb')
+        )
+        try:
+            while line := await reader.readline():
+                self.health = json.loads(line)
+                self.reported_at = time.monotonic()
+        finally:
+            transport.close()
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(HEARTBEAT)
+            silent = time.monotonic() - self.reported_at
+            if silent > SILENT_FOR:
+                log(f"worker {self.index} hasn't reported for {silent:.0f}s, killing it")
+                self.process.kill()
+                return
+
+    def summary(self) -> str:
+        text = f'worker {self.index} (shards {self.shard_ids}): '
+        if self.process is None or self.process.returncode is not None:
+            return text + 'down'
+
+        uptime = datetime.timedelta(seconds=int(time.monotonic() - self.started_at))
+        text += f'up {uptime}, {self.restarts} restarts'
+        if self.health is None:
+            return text + ', not reported yet'
+
+        latencies = [i for i in self.health['latencies'].values() if i is not None]
+        return text + (
+            f", {'ready' if self.health['ready'] else 'connecting'}"
+            f", {self.health['guilds']} guilds, {self.health['games']} open games"
+            f", {max(latencies, default=math.nan):.0f} ms max latency"
+            f", {self.health['lag']['p99']:.0f} ms p99 loop lag"
+            f", {self.health['rss'] / 1024 / 1024:.1f} MiB"
+        )
+
+
+async def recommended_shards(api_base: str, token: str) -> int:
+    async with aiohttp.ClientSession(headers={'Authorization': f'Bot {token}'}) as session:
+        async with session.get(f'{api_base}/gateway/bot') as response:
+            response.raise_for_status()
+            return (await response.json())['shards']
+
+
+async def report(workers: list[Worker]):
+    while True:
+        await asyncio.sleep(SUMMARY_EVERY)
+        healths = [worker.health for worker in workers if worker.health is not None]
+        up = sum(worker.process is not None and worker.process.returncode is None for worker in workers)
+        ready = sum(len(worker.shard_ids) for worker in workers if worker.health and worker.health['ready'])
+        shards = sum(len(worker.shard_ids) for worker in workers)
+        log(
+            f'{up}/{len(workers)} workers up, {ready}/{shards} shards ready, '
+            f"{sum(i['guilds'] for i in healths)} guilds, {sum(i['games'] for i in healths)} open games"
+        )
+        for worker in workers:
+            log('  ' + worker.summary())
+
+
+async def main():
+    config = json.load(open('config_defaults.json')) | json.load(open('config.json'))
+    shard_count = config['cluster']['shards']
+    if shard_count is None:
+        shard_count = await recommended_shards(config['api_base'], open('TOKEN').read().strip())
+
+    count = min(config['cluster']['workers'], shard_count)
+    workers = [Worker(i, list(range(shard_count))[i::count], shard_count) for i in range(count)]
+    log(f'running {shard_count} shards on {count} workers')
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, lambda: [worker.stop() for worker in workers])
+
+    reporter = asyncio.create_task(report(workers))
+    await asyncio.gather(*(worker.run() for worker in workers))
+    reporter.cancel()
+    log('stopped')
+
+
+asyncio.run(main())
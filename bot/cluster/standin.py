@@ -0,0 +1,152 @@
+"""A stand-in for Discord's API and gateway, enough for workers to log in, connect their shards and get
+their guilds, to try out a cluster on one machine
+
+Run with `python -m bot.cluster.standin [--port int] [--guilds int] [--shards int]` and set the
+config's `api_base` to `http://localhost:<port>/api/v10`. Every shard gets the guilds that Discord
+would send it, and any other request gets a 404
+"""
+import argparse
+import itertools
+import json
+
+from aiohttp import web
+
+HEARTBEAT_INTERVAL = 5000
+USER = {'id': '1', 'username': 'tetris', 'discriminator': '0000', 'avatar': None, 'bot': True}
+OWNER = {'id': '2', 'username': 'owner', 'discriminator': '0000', 'avatar': None}
+APPLICATION = {
+    'id': '1',
+    'name': 'tetris',
+    'description': '',
+    'icon': None,
+    'flags': 0,
+    'bot_public': True,
+    'bot_require_code_grant': False,
+    'owner': OWNER,
+    'verify_key': ''
+}
+
+
+def json_response(data: dict, status: int = 200) -> web.Response:
+    # discord.py only parses bodies with exactly this content type, without a charset
+    return web.Response(body=json.dumps(data).encode(), status=status, content_type='application/json')
+
+
+def guild(guild_id: int) -> dict:
+    return {
+        'id': str(guild_id),
+        'name': f'guild {guild_id}',
+        'owner_id': OWNER['id'],
+        'member_count': 1,
+        'large': False,
+        'unavailable': False,
+        'features': [],
+        'roles': [{
+            'id': str(guild_id),
+            'name': '@everyone',
+            'permissions': '0',
+            'position': 0,
+            'color': 0,
+            'hoist': False,
+            'managed': False,
+            'mentionable': False
+        }],
+        'channels': [{
+            'id': str(guild_id + 1),
+            'type': 0,
+            'name': 'tetris',
+            'position': 0
+        }],
+        'emojis': [],
+        'stickers': [],
+        'members': [],
+        'threads': [],
+        'voice_states': [],
+        'presences': [],
+        'stage_instances': [],
+        'guild_scheduled_events': [],
+    }
+
+
+class StandIn:
+    def __init__(self, port: int, guilds: int, shards: int):
+        self.url = f'ws://localhost:{port}/gateway'
+        # Shards are picked by the snowflake's timestamp, so these go to each of them in turn
+        self.guild_ids = [(i + 1) << 22 for i in range(guilds)]
+        self.shards = shards
+        self.app = web.Application()
+        self.app.add_routes([
+            web.get('/api/v10/gateway', self.gateway),
+            web.get('/api/v10/gateway/bot', self.gateway),
+            web.get('/api/v10/users/@me', self.user),
+            web.get('/api/v10/oauth2/applications/@me', self.application),
+            web.get('/gateway', self.connect),
+            web.route('*', '/{path:.*}', self.not_found),
+        ])
+
+    async def gateway(self, request: web.Request) -> web.Response:
+        return json_response({
+            'url': self.url,
+            'shards': self.shards,
+            'session_start_limit': {
+                'total': 1000,
+                'remaining': 1000,
+                'reset_after': 0,
+                'max_concurrency': 1
+            }
+        })
+
+    async def user(self, request: web.Request) -> web.Response:
+        return json_response(USER)
+
+    async def application(self, request: web.Request) -> web.Response:
+        return json_response(APPLICATION)
+
+    async def not_found(self, request: web.Request) -> web.Response:
+        return json_response({'message': 'Not handled by the stand-in', 'code': 0}, status=404)
+
+    async def connect(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        seq = itertools.count(1)
+        await ws.send_json({'op': 10, 'd': {'heartbeat_interval': HEARTBEAT_INTERVAL}, 's': None, 't': None})
+        async for message in ws:
+            payload = message.json()
+            if payload['op'] == 1:
+                await ws.send_json({'op': 11, 'd': None, 's': None, 't': None})
+
+            elif payload['op'] == 2:
+                shard_id, shard_count = payload['d'].get('shard', [0, 1])
+                guild_ids = [i for i in self.guild_ids if (i >> 22) % shard_count == shard_id]
+                print(f'shard {shard_id}/{shard_count} connected with {len(guild_ids)} guilds', flush=True)
+                ready = {
+                    'v': 10,
+                    'user': USER,
+                    'guilds': [{
+                        'id': str(i),
+                        'unavailable': True
+                    } for i in guild_ids],
+                    'session_id': f'standin-{shard_id}',
+                    'resume_gateway_url': self.url,
+                    'shard': [shard_id, shard_count],
+                    'application': {
+                        'id': APPLICATION['id'],
+                        'flags': 0
+                    },
+                    'private_channels': [],
+                    'relationships': []
+                }
+                await ws.send_json({'op': 0, 'd': ready, 's': next(seq), 't': 'READY'})
+                for guild_id in guild_ids:
+                    await ws.send_json({'op': 0, 'd': guild(guild_id), 's': next(seq), 't': 'GUILD_CREATE'})
+
+        return ws
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--guilds', type=int, default=20)
+    parser.add_argument('--shards', type=int, default=2, help='how many shards /gateway/bot recommends')
+    args = parser.parse_args()
+    web.run_app(StandIn(args.port, args.guilds, args.shards).app, port=args.port)
@@ -1,26 +1,176 @@
+import ast
 import asyncio
+import graphlib
+import importlib
+import math
+import pathlib
+import pkgutil
 import subprocess
-from typing import Literal
+import sys
+import time
+import traceback
+from types import ModuleType
+from typing import Literal, Optional
 
 import discord
 import psutil
 from discord.ext import commands
+from discord.ext import tasks
+
+from bot import cluster
+from bot import exts
+from bot.lib.controls import Controls
+from bot.lib.game import Actions
 
 
 class OnMaintenance(commands.CheckFailure):
     pass
 
 
+def lib_modules() -> list[ModuleType]:
+    """Every loaded `bot.lib` module, after the ones it imports in its current source
+
+    Raises if any of them can't be parsed, or if they import each other in a cycle
+    """
+    modules = {name: module for name, module in sys.modules.items() if name.startswith('bot.lib.')}
+    imports = {}
+    for name, module in modules.items():
+        imported = set()
+        for node in ast.walk(ast.parse(pathlib.Path(module.__file__).read_text(), module.__file__)):
+            if isinstance(node, ast.ImportFrom) and node.module is not None:
+                imported.add(node.module)
+                imported.update(f'{node.module}.{alias.name}' for alias in node.names)
+            elif isinstance(node, ast.Import):
+                imported.update(alias.name for alias in node.names)
+
+        imports[name] = imported & modules.keys() - {name}
+
+    return [modules[name] for name in graphlib.TopologicalSorter(imports).static_order()]
+
+
 class Manager(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        self.games: dict[int, discord.View] = {}
+        self.controls: Optional[Controls] = None
+        self.evict_idle.start()
+        if bot.cluster is not None:
+            self.report_health.start()
+        if bot.is_ready():
+            # Reloaded, so there won't be another `on_ready`
+            self.add_controls()
+
+    def cog_unload(self):
+        self.evict_idle.cancel()
+        self.report_health.cancel()
+        if self.controls is not None:
+            self.controls.stop()
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        if self.controls is None:
+            self.add_controls()
+
+    def add_controls(self):
+        self.controls = Controls(self.press)
+        self.bot.add_view(self.controls)
+
+    async def press(self, action: Actions, interaction: discord.Interaction):
+        session = self.bot.sessions.get(interaction.message.id)
+        if session is None:
+            await interaction.response.send_message("This game isn't running anymore!", ephemeral=True)
+            return
+
+        if interaction.user.id != session.user_id:
+            return
+
+        session.play(action)
+        self.bot.scheduler.submit(session, interaction)
+
+    @tasks.loop(minutes=1)
+    async def evict_idle(self):
+        self.bot.sessions.evict(self.bot.config['session_idle'])
+
+    @evict_idle.before_loop
+    async def before_evict_idle(self):
+        await self.bot.wait_until_ready()
+
+    @tasks.loop(seconds=cluster.HEARTBEAT)
+    async def report_health(self):
+        """Tells the cluster's supervisor this worker is still running, from before it's ready"""
+        self.bot.cluster.report({
+            'ready': self.bot.is_ready(),
+            'latencies': {
+                shard_id: round(latency * 1000) if math.isfinite(latency) else None
+                for shard_id, latency in self.bot.latencies
+            },
+            'guilds': len(self.bot.guilds),
+            'games': len(self.bot.sessions.active),
+            'edits': self.bot.scheduler.stats(),
+            'lag': self.bot.lag.stats(),
+            'rss': psutil.Process().memory_info().rss
+        })
+
+    async def reload(self) -> int:
+        """Reloads `bot.lib` and every extension in place, returns how many open sessions were carried over
+
+        Open sessions are stored and rehydrated by the new code once they're played or shown again,
+        so no input is lost, and frames that were waiting are sent by the new scheduler
+        """
+        bot = self.bot
+        # Raises before anything's changed if the new code doesn't even compile
+        for path in pathlib.Path(exts.__path__[0]).rglob('*.py'):
+            compile(path.read_text(), str(path), 'exec')
+        modules = lib_modules()
+
+        # Waits for the frames being sent, presses meanwhile are still queued on their session
+        await bot.scheduler.close()
+        # So closing the db below, which blocks, has little left to commit
+        await bot.db.flush()
+
+        # Nothing from here on awaits, so no press comes between storing the sessions and the new
+        # code taking them over
+        pending = [(session.message_id, interaction) for session, interaction in bot.scheduler.pending()]
+        migrated = bot.sessions.checkpoint()
+        # Its workers have imported the old code
+        bot.offload.shutdown()
+        reloaded = {module.__name__: importlib.reload(module) for module in modules}
+        bot.load_config()
+        # Opened first, so if it can't be the old one is still there to restart with
+        database = reloaded['bot.lib.db'].Database(bot.db.path)
+        bot.db.close()
+        bot.db = database
+        bot.offload = reloaded['bot.lib.offload'].Offload()
+        bot.scheduler = reloaded['bot.lib.scheduler'].EditScheduler(bot)
+        bot.sessions = reloaded['bot.lib.session'].Sessions(bot)
+        for module in pkgutil.walk_packages(exts.__path__, exts.__name__ + '.'):
+            try:
+                if module.name in bot.extensions:
+                    bot.reload_extension(module.name)
+                else:
+                    bot.load_extension(module.name)
+
+            except commands.NoEntryPointError:
+                pass
+
+        for message_id, interaction in pending:
+            session = bot.sessions.get(message_id)
+            if session is not None:
+                bot.scheduler.submit(session, interaction)
+
+        return migrated
 
     PULL_OPTS = ('nopull', 'pull', 'forcepull')
 
     @commands.command(hidden=True)
     @commands.is_owner()
-    async def doupdate(self, ctx: commands.Context, pull_option: Literal[PULL_OPTS] = 'pull'):
+    async def doupdate(
+        self,
+        ctx: commands.Context,
+        pull_option: Literal[PULL_OPTS] = 'pull',
+        how: Literal['reload', 'restart'] = 'reload'
+    ):
+        """Pulls changes and reloads the code in place, or restarts the whole process (e.g. for new
+        dependencies or changes to `bot/__main__.py`)"""
         if pull_option != 'nopull':
             git_proc = await asyncio.subprocess.create_subprocess_shell(
                 'git pull --dry-run --no-ff', stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
@@ -65,24 +215,48 @@ class Manager(commands.Cog):
         self.bot.add_check(lock)
         await self.bot.change_presence(status=discord.Status.dnd, activity=discord.Game('Reloading!'))
 
-        if self.games:
-            await asyncio.sleep(120)
-            for view in self.games.values():
-                view.stop()
+        if how == 'reload':
+            start = time.perf_counter()
+            try:
+                migrated = await self.reload()
 
-        self.bot.db.storage.flush()
+            except Exception:
+                traceback.print_exc()
+                await ctx.send("Couldn't reload, restarting instead")
+
+            else:
+                # The reloaded stats extension sets the presence back
+                self.bot.remove_check(lock)
+                await ctx.send(
+                    f'Reloaded in `{time.perf_counter() - start:.2f}s`, carried over `{migrated}` open games'
+                )
+                return
+
+        # Stored games keep going after restarting, once they're pressed
+        self.bot.sessions.evict()
+        await self.bot.db.flush()
         await asyncio.sleep(10)
-        # FIXME: This forks and doesn't inherit the console (if any)
-        subprocess.Popen(psutil.Process().cmdline())
+        # The cluster's supervisor starts workers again itself
+        if self.bot.cluster is None:
+            # FIXME: This forks and doesn't inherit the console (if any)
+            subprocess.Popen(psutil.Process().cmdline())
         await self.bot.close()
 
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def reloadconfig(self, ctx: commands.Context):
+        """Reloads config.json without restarting, running games keep going with the new skins"""
+        self.bot.load_config()
+        await ctx.message.add_reaction('\N{white heavy check mark}')
+
     @commands.command(aliases=['cancel', 'quit'])
     async def stop(self, ctx: commands.Context):
         """Stops the current game"""
-        if ctx.author.id not in self.games:
+        session = self.bot.sessions.of_user(ctx.author.id)
+        if session is None:
             raise commands.CheckFailure("There isn't any game running!")
 
-        self.games[ctx.author.id].stop()
+        self.bot.sessions.close(session)
         await ctx.message.add_reaction('\N{waving hand sign}')
 
 
@@ -1,8 +1,12 @@
+from typing import Literal, Optional
+
 import discord
 import numpy as np
 from discord.ext import commands
-from tinydb import where
 
+from bot.lib import maps
+from bot.lib import skins
+from bot.lib.export import send_replay
 from bot.lib.game import Game
 from bot.lib.game import Pieces
 from bot.lib.maps import Encoder
@@ -37,38 +41,30 @@ class Maps(commands.Cog):
 
     @commands.command()
     async def view(self, ctx: commands.Command, encoded: str):
+        user_skin = self.bot.db.settings.get(ctx.author.id).get('skin', 0)
         try:
-            board, piece = Encoder.decode(encoded.strip('`'))
+            description = maps.render(encoded.strip('`'), user_skin)
         except ValueError as e:
             raise commands.BadArgument('Invalid map string') from e
 
-        if piece is not None:
-            ghost = piece.copy()
-            ghost.x += 30
-            for x, y in ghost.shape + ghost.pos:
-                board[x, y] = 9
-
-            for x, y in piece.shape + piece.pos:
-                board[x, y] = piece.type
-
-        user_skin = self.bot.db.table('settings').get(where('user_id') == ctx.author.id).get('skin', 0)
-
-        await ctx.send(
-            embed=discord.Embed(
-                color=0xfa50a0,
-                description='\n'.join(
-                    ''.join(self.bot.config['skins'][user_skin]['pieces'][j] for j in i) for i in board[-16:]
-                )
-            )
-        )
+        await ctx.send(embed=discord.Embed(color=0xfa50a0, description=description))
 
     @commands.command()
-    async def export(self, ctx: commands.Context):
-        games: dict[int, discord.View] = self.bot.get_cog('Manager').games
-        if ctx.author.id not in games:
+    async def export(self, ctx: commands.Context, option: Optional[Literal['--gif']] = None):
+        """Sends your current board as a map string, or with `--gif` the game so far as an animated GIF"""
+        session = self.bot.sessions.of_user(ctx.author.id)
+        if session is None:
             raise commands.CheckFailure("There isn't any game running!")
 
-        game: Game = games[ctx.author.id].game
+        game: Game = session.game
+        if option == '--gif':
+            colors = skins.get(game.skin).colors
+            log, _ = self.bot.sessions.full_log(session)
+            async with ctx.typing():
+                await send_replay(self.bot.offload, ctx, game.initial(self.bot.config), log, colors)
+
+            return
+
         encoded = Encoder.encode(game.board, game.current_piece)
         await ctx.send(f'`{encoded}`')
 
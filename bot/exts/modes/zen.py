@@ -1,27 +1,33 @@
 import discord
-import numpy as np
 from discord.ext import commands
 from discord.ext import tasks
-from tinydb import TinyDB
-from tinydb import where
-from tinydb.table import Table
 
-from bot.lib.controls import Controls
+from bot.lib import skins
+from bot.lib.export import send_replay
+from bot.lib.game import Actions
+from bot.lib.game import BitBoard
 from bot.lib.game import Game
 from bot.lib.game import Piece
 from bot.lib.game import Queue
+from bot.lib.history import History
 from bot.lib.maps import Encoder
+from bot.lib.replay import InputLog
+from bot.lib.session import MODES
+from bot.lib.session import Session
 
 
 class ZenGame(Game):
-    def __init__(self, save, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+    def __init__(self, save, config: dict, *args, **kwargs):
+        super().__init__(config, *args, **kwargs)
+        self.start = {k: v for k, v in save.items() if k != 'user_id'}
 
-        self.queue = Queue(initial_queue=save.get('queue', []), initial_bag=save.get('bag', []))
+        self.queue = Queue(initial_queue=save.get('queue', []), initial_bag=save.get('bag', []), rng=self.rng)
         if save.get('board') is not None:
-            self.board, self.current_piece = Encoder.decode(save['board'])
+            board, piece = Encoder.decode(save['board'])
+            self.board = BitBoard(board)
+            self.current_piece = Piece(self.board, piece.type, piece.x, piece.y, piece.rot)
         else:
-            self.board = np.zeros((30, 10), dtype=np.int8)
+            self.board = BitBoard()
             self.current_piece = Piece(self.board, self.queue.pop())
 
         self.score: int = save.get('score', 0)
@@ -29,6 +35,38 @@ class ZenGame(Game):
         self.hold_lock = save.get('hold_lock', False)
         self.previous_score = self.score
         self.can_pc = self.board.any()
+        # Only kept while playing, it isn't saved
+        self.history = History(config['undo_depth'])
+
+    @property
+    def can_undo(self) -> bool:
+        return bool(self.history.undos)
+
+    @property
+    def can_redo(self) -> bool:
+        return bool(self.history.redos)
+
+    def undo(self):
+        self.history.undo(self)
+
+    def redo(self):
+        self.history.redo(self)
+
+    def hard_drop(self):
+        self.history.save(self)
+        super().hard_drop()
+
+    def swap(self):
+        self.history.save(self)
+        super().swap()
+
+    def restart(self):
+        # Only the player's resets are undone on their own, topping out is undone with its drop
+        self.history.save(self)
+        super().restart()
+
+    def initial(self, config: dict) -> 'ZenGame':
+        return ZenGame(self.start, config, {}, seed=self.seed)
 
     def to_save(self) -> dict:
         return {
@@ -41,23 +79,23 @@ class ZenGame(Game):
         }
 
 
+MODES['zen'] = ZenGame
+
+
 class Zen(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        self.db: TinyDB = bot.db
-        self.db_table: Table = bot.db.table('zen')
         self.autosave.start()
 
+    def cog_unload(self):
+        self.autosave.cancel()
+
     @tasks.loop(minutes=5)
     async def autosave(self):
-        for author, view in self.bot.get_cog('Manager').games.items():
-            if not isinstance(view.game, ZenGame):
-                continue
-
-            self.db_table.upsert(
-                view.game.to_save() | {'user_id': view.ctx.author.id},
-                where('user_id') == author
-            )
+        self.bot.sessions.store_all(self.bot.sessions.active.values())
+        self.bot.db.zen.save_all((session.user_id, session.game.to_save())
+                                 for session in self.bot.sessions.active.values()
+                                 if session.mode == 'zen')
 
     @autosave.before_loop
     async def before_autosave(self):
@@ -76,9 +114,7 @@ class Zen(commands.Cog):
         if ctx.invoked_subcommand is not None:
             return
 
-        games: dict[int, Controls] = self.bot.get_cog('Manager').games
-
-        if ctx.author.id in games:
+        if self.bot.sessions.of_user(ctx.author.id) is not None:
             await ctx.send("There's already a game running!")
             return
 
@@ -86,32 +122,60 @@ class Zen(commands.Cog):
             url='https://media.discordapp.net/attachments/825871731155664907/884158159537704980/dtc.gif'
         )
         msg = await ctx.send(embed=embed)
-        user_settings: dict[str, int] = self.db.table('settings').get(where('user_id') == ctx.author.id) or {}
-        user_controls = Controls.from_config(user_settings)
+        user_settings = self.bot.db.settings.get(ctx.author.id)
+        save = self.bot.db.zen.get(ctx.author.id) or {}
+        game = ZenGame(save, self.bot.config, user_settings)
+        session = Session.start('zen', game, ctx.author, msg, user_settings.get('controls', 0))
+        self.bot.sessions.open(session)
+        self.bot.scheduler.submit(session)
+
+    @commands.Cog.listener()
+    async def on_session_end(self, session: Session):
+        if session.mode != 'zen':
+            return
 
-        game = ZenGame(
-            self.db_table.get(where('user_id') == ctx.author.id) or {}, self.bot.config, user_settings
-        )
-        view = user_controls(game, ctx, msg)
-        games[ctx.author.id] = view
-        await view.update_message()
-        await view.wait()
+        game: ZenGame = session.game
+        self.bot.db.zen.save(session.user_id, game.to_save())
+        log, checkpoints = self.bot.sessions.full_log(session)
+        if log:
+            # Enough to replay the whole session headlessly, see `audit.py`
+            self.bot.db.replays.add({
+                'user_id': session.user_id,
+                'seed': game.seed,
+                # Undoing past it does nothing, so replays need the same one
+                'undo_depth': game.history.undos.maxlen,
+                'start': game.start,
+                'log': log.encode(),
+                # What the session was rehydrated from, checked against the replay
+                'checkpoints': checkpoints,
+                'end': game.to_save()
+            })
 
-        self.db_table.upsert(game.to_save() | {'user_id': ctx.author.id}, where('user_id') == ctx.author.id)
+    @zen.command()
+    async def replay(self, ctx: commands.Context):
+        """Sends your last zen session as an animated GIF"""
+        record = self.bot.db.replays.last(ctx.author.id)
+        if record is None:
+            await ctx.send("You don't have any recorded sessions yet!")
+            return
 
-        del games[ctx.author.id]
+        config = self.bot.config | {'undo_depth': record.get('undo_depth', self.bot.config['undo_depth'])}
+        game = ZenGame(record['start'], config, {}, seed=record['seed'])
+        user_settings = self.bot.db.settings.get(ctx.author.id)
+        colors = skins.get(user_settings.get('skin', 0)).colors
+        async with ctx.typing():
+            await send_replay(self.bot.offload, ctx, game, InputLog.decode(record['log']), colors)
 
     @zen.command()
     async def restart(self, ctx: commands.Context):
         """Restarts current zen game, all score is kept"""
-        games: dict[int, Controls] = self.bot.get_cog('Manager').games
-
-        if ctx.author.id not in games or not isinstance(games[ctx.author.id].game, ZenGame):
+        session = self.bot.sessions.of_user(ctx.author.id)
+        if session is None or session.mode != 'zen':
             await ctx.send("There isn't a zen game running!")
             return
 
-        games[ctx.author.id].game.reset()
-        await games[ctx.author.id].update_message()
+        session.play(Actions.RESET)
+        self.bot.scheduler.submit(session)
 
 
 def setup(bot: commands.Bot):
@@ -2,8 +2,6 @@ import datetime
 import gc
 import inspect
 import json
-import pathlib
-import statistics
 import sys
 from typing import Optional
 
@@ -11,19 +9,18 @@ import discord
 import psutil
 from discord.ext import commands
 from discord.ext import tasks
-from tinydb import TinyDB
-from tinydb import where
+
+from bot.lib import maps
 
 
 class Stats(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        self.db: TinyDB = bot.db
         self.status_msg: discord.Message = None
-        self.update_leaderboard.start()
         self.update_status.start()
 
     def cog_unload(self):
+        self.update_status.cancel()
         # mmmmMMm hacky code.. erh, here's what's up with it:
         #  -> commands.Bot.close() unloads extensions before calling super().close() ...
         #      So, that gives us time to do this
@@ -48,43 +45,29 @@ class Stats(commands.Cog):
             gc.freeze()
             task.add_done_callback(lambda *_: gc.unfreeze())
 
-    @tasks.loop(minutes=5)
-    async def update_leaderboard(self):
-        for table in ['zen']:
-            top = sorted(
-                ({'user_id': i['user_id'], 'score': i['score']} for i in self.db.table(table)),
-                key=lambda x: x['score'], reverse=True
-            )  # yapf: disable
-
-            if top:
-                self.db.table('leaderboard').upsert(
-                    {'table': table, 'top': top, 'median': int(statistics.median(i['score'] for i in top))},
-                    where('table') == table
-                )  # yapf: disable
-            else:
-                self.db.table('leaderboard').remove(where('table') == table)
-
-    @update_leaderboard.before_loop
-    async def before_update_leaderboard(self):
-        await self.bot.wait_until_ready()
-
     @tasks.loop(minutes=15)
     async def update_status(self):
         if self.status_msg is None:
             status_msg: dict[str, int] = self.bot.config.get('status_msg')
             if status_msg is not None:
+                channel = self.bot.get_channel(status_msg['ch'])
+                if channel is None:
+                    # On another worker of the cluster
+                    return
+
                 try:
-                    self.status_msg = await self.bot.get_channel(status_msg['ch']) \
-                                                    .fetch_message(status_msg['msg'])
+                    self.status_msg = await channel.fetch_message(status_msg['msg'])
                 except discord.NotFound:
                     config = json.load(open('config.json'))
                     del config['status_msg']
-                    json.dump(config, open('config.json', 'w'))
-                    self.bot.config = config
+                    with open('config.json', 'w') as fp:
+                        json.dump(config, fp)
+                    self.bot.load_config()
             else:
                 return
 
         proc = psutil.Process()
+        caches = maps.cache_info() | {'settings': self.bot.db.settings.cache_info()}
         with proc.oneshot():
             await self.status_msg.edit(
                 embed=discord.Embed(
@@ -95,10 +78,39 @@ class Stats(commands.Cog):
                 ).add_field(
                     name='Data/usage',
                     value=(
-                        f'`db.json` has `{pathlib.Path("db.json").stat().st_size / 1024:.2f}kb` of data\n'
+                        f'`{self.bot.db.path}` has `{self.bot.db.size() / 1024:.2f}kb` of data\n'
                         f'`{proc.memory_info().rss / 1024 / 1024:.2f} mb` of '
                         f'`{psutil.virtual_memory().total / 1024 / 1024:.2f} mb` RAM has been allocated\n'
-                        f'`{proc.cpu_percent():.2f}%` CPU used in `{proc.num_threads()}` threads'
+                        f'`{proc.cpu_percent():.2f}%` CPU used in `{proc.num_threads()}` threads\n'
+                        f'`{len(self.bot.sessions.active)}` of `{len(self.bot.db.sessions)}` open games '
+                        'in memory'
+                    )
+                ).add_field(
+                    name='Caches',
+                    value='\n'.join(
+                        f'`{name}`: `{i.hits}` hits, `{i.misses}` misses, `{i.currsize}/{i.maxsize}` kept'
+                        for name, i in caches.items()
+                    )
+                ).add_field(
+                    name='Message edits',
+                    value='\n'.join(
+                        f'`{name}`: `{count}`' for name, count in self.bot.scheduler.stats().items()
+                    )
+                ).add_field(
+                    name='Event loop',
+                    value='\n'.join(
+                        f'`{name}`: `{value:.0f}`' + (' ms late' if name != 'slow steps' else '')
+                        for name, value in self.bot.lag.stats().items()
+                    )
+                ).add_field(
+                    name='Database writes',
+                    value='\n'.join(
+                        f'`{name}`: `{count}`' for name, count in self.bot.db.writer.stats().items()
+                    )
+                ).add_field(
+                    name='Offloaded work',
+                    value='\n'.join(
+                        f'`{name}`: `{count}`' for name, count in self.bot.offload.stats().items()
                     )
                 ).set_footer(text='Updates every 15 minutes')
             )
@@ -116,12 +128,12 @@ class Stats(commands.Cog):
         if mode is None:
             embed = discord.Embed(color=0xfa50a0, title='Top scores on all modes')
 
-            for i in self.db.table('leaderboard'):
+            for table_name in self.bot.db.leaderboard.modes():
                 embed.add_field(
-                    name=i["table"].title(),
+                    name=table_name.title(),
                     value='\n'.join(
-                        '**#{}**: <@{user_id}>: **{score:,}**'.format(j + 1, **k)
-                        for j, k in enumerate(i['top'][:5])
+                        f'**#{i + 1}**: <@{user_id}>: **{score:,}**'
+                        for i, (user_id, score) in enumerate(self.bot.db.leaderboard.top(table_name, 0, 5))
                     )
                 )
 
@@ -129,18 +141,19 @@ class Stats(commands.Cog):
 
         else:
             table_name = mode.lower()
-            if self.db.table('leaderboard').contains(where('table') == table_name):
-                table = self.db.table('leaderboard').get(where('table') == table_name)
-                top = table['top']
+            leaderboard = self.bot.db.leaderboard
+            count = leaderboard.count(table_name)
+            if count:
+                top = leaderboard.top(table_name, (page - 1) * 15, page * 15)
                 await ctx.send(
                     embed=discord.Embed(
                         color=0xfa50a0,
                         title=f'Top scores on {table_name}',
-                        description=f'*Median score: **{table["median"]:,}***\n\n' + '\n'.join(
-                            f'**#{i + 1 + (page - 1) * 15}**: <@{j["user_id"]}>: **{j["score"]:,}**'
-                            for i, j in enumerate(top[(page - 1) * 15:page * 15])
+                        description=f'*Median score: **{leaderboard.median(table_name):,}***\n\n' + '\n'.join(
+                            f'**#{i + 1 + (page - 1) * 15}**: <@{user_id}>: **{score:,}**'
+                            for i, (user_id, score) in enumerate(top)
                         )
-                    ).set_footer(text=f'Page {page} of {len(top) // 15 + 1} · top {page} {table_name}')
+                    ).set_footer(text=f'Page {page} of {count // 15 + 1} · top {page} {table_name}')
                 )
             else:
                 await ctx.send(f"Score for {table_name} doesn't exist!")
@@ -159,8 +172,9 @@ class Stats(commands.Cog):
         )
         config = json.load(open('config.json'))
         config['status_msg'] = {'ch': channel.id, 'msg': msg.id}
-        json.dump(config, open('config.json', 'w'))
-        self.bot.config = config
+        with open('config.json', 'w') as fp:
+            json.dump(config, fp)
+        self.bot.load_config()
         self.update_status.restart()
 
 
@@ -1,195 +1,106 @@
-import discord
-from discord.ext import commands
-
-from bot.lib.game import Game
-
-
-class Controls(discord.ui.View):
-    def __init__(self, game: Game, ctx: commands.Context, message: discord.Message):
-        super().__init__()
-        self.game = game
-        self.ctx = ctx
-        self.message = message
-
-    @staticmethod
-    def from_config(config: dict[str, int]) -> 'Controls':
-        cfg = config.get('controls', 0)
-        if cfg == 0:
-            return BasicControls
-        if cfg == 1:
-            return AdvancedControls
-        if cfg == 2:
-            return CompactControls
-
-        return BasicControls
-
-    async def interaction_check(self, interaction: discord.Interaction):
-        return interaction.user == self.ctx.author
-
-    async def update_message(self):
-        self.swap.disabled = self.game.hold_lock
-        embed = self.game.get_embed()
-        embed.set_footer(text=self.ctx.author, icon_url=self.ctx.author.avatar)
-        await self.message.edit(embed=embed, view=self)
-
-
-class AdvancedControls(Controls):
-    """More complete controls for finesse
-
-    Layout is
-        [Rotate  <-] [Rotate ->] [Hard drop] [Swap   ] [Rotate  x2]
-        [Charge <<-] [Move   <-] [Soft drop] [Move ->] [Charge ->>]
-    """
-    @discord.ui.button(label='↺', style=discord.ButtonStyle.primary)
-    async def rotate_ccw(self, button: discord.ui.Button, interaction: discord.Interaction):
-        self.game.rotate(-1)
-        await self.update_message()
-
-    @discord.ui.button(label='↻', style=discord.ButtonStyle.primary)
-    async def rotate_cw(self, button: discord.ui.Button, interaction: discord.Interaction):
-        self.game.rotate(+1)
-        await self.update_message()
-
-    @discord.ui.button(label='⇊', style=discord.ButtonStyle.primary)
-    async def hard_drop(self, button: discord.ui.Button, interaction: discord.Interaction):
-        self.game.hard_drop()
-        await self.update_message()
-
-    @discord.ui.button(label='⤭', style=discord.ButtonStyle.primary)
-    async def swap(self, button: discord.ui.Button, interaction: discord.Interaction):
-        self.game.swap()
-        await self.update_message()
-
-    @discord.ui.button(label='🗘', style=discord.ButtonStyle.primary)
-    async def rotate_cw2(self, button: discord.ui.Button, interaction: discord.Interaction):
-        self.game.rotate(2)
-        await self.update_message()
-
-    @discord.ui.button(label='↞', style=discord.ButtonStyle.primary)
-    async def charge_left(self, button: discord.ui.Button, interaction: discord.Interaction):
-        self.game.drag(-10)
-        await self.update_message()
-
-    @discord.ui.button(label='🡸', style=discord.ButtonStyle.primary)
-    async def move_left(self, button: discord.ui.Button, interaction: discord.Interaction):
-        self.game.drag(-1)
-        await self.update_message()
-
-    @discord.ui.button(label='🡻', style=discord.ButtonStyle.primary)
-    async def soft_drop(self, button: discord.ui.Button, interaction: discord.Interaction):
-        self.game.soft_drop()
-        await self.update_message()
+"""Game buttons, handled by a single persistent view for every game's message
 
-    @discord.ui.button(label='🡺', style=discord.ButtonStyle.primary)
-    async def move_right(self, button: discord.ui.Button, interaction: discord.Interaction):
-        self.game.drag(+1)
-        await self.update_message()
+Messages are sent with their layout's components as plain payloads (see `components`), all using
+the custom ids of `Controls`' buttons, so the one instance registered at startup gets every press,
+including ones on messages sent before a restart, and looks up the game by the message it's on
+"""
+import functools
+from typing import Awaitable, Callable, Optional
 
-    @discord.ui.button(label='↠', style=discord.ButtonStyle.primary)
-    async def charge_right(self, button: discord.ui.Button, interaction: discord.Interaction):
-        self.game.drag(+10)
-        await self.update_message()
-
-
-class BasicControls(Controls):
-    """Simpler, default controls
+import discord
 
-    Layout is
-        [       ] [Hard drop] [       ] [Swap     ] [Rotate x2]
-        [Move <-] [Soft drop] [Move ->] [Rotate <-] [Rotate ->]
+from bot.lib.game import Actions
+
+LABELS = {
+    Actions.ROTATE_CCW: '↺',
+    Actions.ROTATE_CW: '↻',
+    Actions.ROTATE_180: '🗘',
+    Actions.HARD_DROP: '⇊',
+    Actions.SOFT_DROP: '🡻',
+    Actions.SWAP: '⤭',
+    Actions.MOVE_LEFT: '🡸',
+    Actions.MOVE_RIGHT: '🡺',
+    Actions.CHARGE_LEFT: '↞',
+    Actions.CHARGE_RIGHT: '↠',
+    Actions.UNDO: '↶',
+    Actions.REDO: '↷',
+}
+# Rows of actions, `None` being an empty space, by the index of their name in the settings. Undo and
+# redo are shared by every layout, on a row of their own below it
+LAYOUTS: list[list[list[Optional[Actions]]]] = [
+    # Basic, the default
+    #   [       ] [Hard drop] [       ] [Swap     ] [Rotate x2]
+    #   [Move <-] [Soft drop] [Move ->] [Rotate <-] [Rotate ->]
+    [
+        [None, Actions.HARD_DROP, None, Actions.SWAP, Actions.ROTATE_180],
+        [Actions.MOVE_LEFT, Actions.SOFT_DROP, Actions.MOVE_RIGHT, Actions.ROTATE_CCW, Actions.ROTATE_CW],
+    ],
+    # Advanced, more complete for finesse
+    #   [Rotate  <-] [Rotate ->] [Hard drop] [Swap   ] [Rotate  x2]
+    #   [Charge <<-] [Move   <-] [Soft drop] [Move ->] [Charge ->>]
+    [
+        [Actions.ROTATE_CCW, Actions.ROTATE_CW, Actions.HARD_DROP, Actions.SWAP, Actions.ROTATE_180],
+        [Actions.CHARGE_LEFT, Actions.MOVE_LEFT, Actions.SOFT_DROP, Actions.MOVE_RIGHT, Actions.CHARGE_RIGHT],
+    ],
+    # Compact
+    #   [Rotate <-] [Hard drop] [Rotate ->] [Rotate x2]
+    #   [Move   <-] [Soft drop] [Move   ->] [Swap     ]
+    [
+        [Actions.ROTATE_CCW, Actions.HARD_DROP, Actions.ROTATE_CW, Actions.ROTATE_180],
+        [Actions.MOVE_LEFT, Actions.SOFT_DROP, Actions.MOVE_RIGHT, Actions.SWAP],
+    ],
+]
+
+
+def custom_id(action: Actions) -> str:
+    return f'controls:{action.name.lower()}'
+
+
+@functools.lru_cache(maxsize=None)
+def components(layout: int, disabled: frozenset[Actions]) -> list[dict]:
+    """The components payload of `layout` with the buttons for `disabled` actions disabled
+
+    It's shared between every call with the same arguments, so it must not be changed
     """
-    @discord.ui.button(label='\u200c', disabled=True, row=0)
-    async def _0(self, *_):
-        pass
-
-    @discord.ui.button(label='⇊', style=discord.ButtonStyle.primary, row=0)
-    async def hard_drop(self, button: discord.ui.Button, interaction: discord.Interaction):
-        self.game.hard_drop()
-        await self.update_message()
-
-    @discord.ui.button(label='\u200c', disabled=True, row=0)
-    async def _1(self, *_):
-        pass
-
-    @discord.ui.button(label='⤭', style=discord.ButtonStyle.primary, row=0)
-    async def swap(self, button: discord.ui.Button, interaction: discord.Interaction):
-        self.game.swap()
-        await self.update_message()
-
-    @discord.ui.button(label='🗘', style=discord.ButtonStyle.primary, row=0)
-    async def rotate_cw2(self, button: discord.ui.Button, interaction: discord.Interaction):
-        self.game.rotate(2)
-        await self.update_message()
-
-    @discord.ui.button(label='🡸', style=discord.ButtonStyle.primary, row=1)
-    async def move_left(self, button: discord.ui.Button, interaction: discord.Interaction):
-        self.game.drag(-1)
-        await self.update_message()
-
-    @discord.ui.button(label='🡻', style=discord.ButtonStyle.primary, row=1)
-    async def soft_drop(self, button: discord.ui.Button, interaction: discord.Interaction):
-        self.game.soft_drop()
-        await self.update_message()
-
-    @discord.ui.button(label='🡺', style=discord.ButtonStyle.primary, row=1)
-    async def move_right(self, button: discord.ui.Button, interaction: discord.Interaction):
-        self.game.drag(+1)
-        await self.update_message()
+    rows = []
+    spaces = 0
+    for actions in LAYOUTS[layout] + [[Actions.UNDO, Actions.REDO]]:
+        buttons = []
+        for action in actions:
+            if action is None:
+                buttons.append({
+                    'type': discord.ComponentType.button.value,
+                    'style': discord.ButtonStyle.secondary.value,
+                    'label': '\u200c',
+                    'custom_id': f'controls:_{spaces}',
+                    'disabled': True
+                })
+                spaces += 1
+                continue
+
+            style = discord.ButtonStyle.secondary if action in (Actions.UNDO, Actions.REDO) \
+                else discord.ButtonStyle.primary
+            buttons.append({
+                'type': discord.ComponentType.button.value,
+                'style': style.value,
+                'label': LABELS[action],
+                'custom_id': custom_id(action),
+                'disabled': action in disabled
+            })
+
+        rows.append({'type': discord.ComponentType.action_row.value, 'components': buttons})
+
+    return rows
 
-    @discord.ui.button(label='↺', style=discord.ButtonStyle.primary, row=1)
-    async def rotate_ccw(self, button: discord.ui.Button, interaction: discord.Interaction):
-        self.game.rotate(-1)
-        await self.update_message()
 
-    @discord.ui.button(label='↻', style=discord.ButtonStyle.primary, row=1)
-    async def rotate_cw(self, button: discord.ui.Button, interaction: discord.Interaction):
-        self.game.rotate(+1)
-        await self.update_message()
-
-
-class CompactControls(Controls):
-    """Compact alternative to BasicControls
+class Controls(discord.ui.View):
+    """Every game button, passing presses on to `on_press(action, interaction)`
 
-    Layout is
-        [Rotate <-] [Hard drop] [Rotate ->] [Rotate x2]
-        [Move   <-] [Soft drop] [Move   ->] [Swap     ]
+    It never times out and only one is registered, it isn't sent with any message itself
     """
-    @discord.ui.button(label='↺', style=discord.ButtonStyle.primary, row=0)
-    async def rotate_ccw(self, button: discord.ui.Button, interaction: discord.Interaction):
-        self.game.rotate(-1)
-        await self.update_message()
-
-    @discord.ui.button(label='⇊', style=discord.ButtonStyle.primary, row=0)
-    async def hard_drop(self, button: discord.ui.Button, interaction: discord.Interaction):
-        self.game.hard_drop()
-        await self.update_message()
-
-    @discord.ui.button(label='↻', style=discord.ButtonStyle.primary, row=0)
-    async def rotate_cw(self, button: discord.ui.Button, interaction: discord.Interaction):
-        self.game.rotate(+1)
-        await self.update_message()
-
-    @discord.ui.button(label='🗘', style=discord.ButtonStyle.primary, row=0)
-    async def rotate_cw2(self, button: discord.ui.Button, interaction: discord.Interaction):
-        self.game.rotate(2)
-        await self.update_message()
-
-    @discord.ui.button(label='🡸', style=discord.ButtonStyle.primary, row=1)
-    async def move_left(self, button: discord.ui.Button, interaction: discord.Interaction):
-        self.game.drag(-1)
-        await self.update_message()
-
-    @discord.ui.button(label='🡻', style=discord.ButtonStyle.primary, row=1)
-    async def soft_drop(self, button: discord.ui.Button, interaction: discord.Interaction):
-        self.game.soft_drop()
-        await self.update_message()
-
-    @discord.ui.button(label='🡺', style=discord.ButtonStyle.primary, row=1)
-    async def move_right(self, button: discord.ui.Button, interaction: discord.Interaction):
-        self.game.drag(+1)
-        await self.update_message()
-
-    @discord.ui.button(label='⤭', style=discord.ButtonStyle.primary, row=1)
-    async def swap(self, button: discord.ui.Button, interaction: discord.Interaction):
-        self.game.swap()
-        await self.update_message()
+    def __init__(self, on_press: Callable[[Actions, discord.Interaction], Awaitable]):
+        super().__init__(timeout=None)
+        for action, label in LABELS.items():
+            button = discord.ui.Button(label=label, custom_id=custom_id(action))
+            button.callback = functools.partial(on_press, action)
+            self.add_item(button)
@@ -0,0 +1,523 @@
+"""The bot's data, in an SQLite database
+
+Every table has a class for what the bot does with it, so none of the rest writes SQL. Per-user rows
+are keyed by user id and leaderboards are indexed by score, so neither a lookup nor a page of the
+leaderboard goes through every row. The database is in WAL mode, so reads don't wait for writes and
+the workers of a cluster (see `bot.cluster`) can all use it at once. Writes don't wait either, they're
+committed in the background by a `Writer`
+"""
+import asyncio
+import atexit
+import json
+import math
+import os
+import queue
+import sqlite3
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Hashable, Iterable, Iterator, NamedTuple, Optional
+
+PATH = 'db.sqlite3'
+# Seconds to wait for another process to finish writing
+TIMEOUT = 10
+MAX_BATCH = 256
+MAX_AGE = 1.0
+# Times a batch is tried again before writing what can be written of it
+RETRIES = 3
+RETRY_DELAY = 1.0
+# Users whose settings are kept in memory
+SETTINGS_CACHED = 16384
+# Seconds between the writer checking whether another process has committed
+CHECK_EVERY = 0.1
+
+# SQL run with each of the rows as its parameters
+Statement = tuple[str, list[tuple]]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS settings (
+    user_id INTEGER PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS zen (
+    user_id INTEGER PRIMARY KEY,
+    save TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leaderboard (
+    mode TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    score INTEGER NOT NULL,
+    PRIMARY KEY (mode, user_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS leaderboard_score ON leaderboard (mode, score DESC);
+CREATE TABLE IF NOT EXISTS sessions (
+    message_id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_user_id ON sessions (user_id);
+CREATE TABLE IF NOT EXISTS session_logs (
+    message_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    log TEXT NOT NULL,
+    checkpoint TEXT NOT NULL,
+    PRIMARY KEY (message_id, seq)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS replays (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS replays_user_id ON replays (user_id, id);
+"""
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+
+
+class Writer:
+    """Runs writes on a thread and connection of its own, so they never hold up the event loop
+
+    Writes are queued and committed in batches, a transaction each, once `max_batch` are queued or the
+    oldest has waited for `max_age` seconds. Every commit is synced to disk and SQLite makes it atomic,
+    so a crash loses at most the last `max_age` seconds of writes, and never half of a batch. Until
+    they're committed, what's been written is read from `pending` instead
+
+    Its connection is also how other processes' commits are noticed, since only theirs change its
+    `PRAGMA data_version`. `external` counts the times it's been seen to change
+    """
+    def __init__(self, path: str, max_batch: int = MAX_BATCH, max_age: float = MAX_AGE):
+        self.path = path
+        self.max_batch = max_batch
+        self.max_age = max_age
+        # What each table has written and not committed yet, by key, with the write it's from.
+        # Iterating it needs `lock`, the thread removes what it's committed
+        self.pending: dict[Hashable, tuple[int, Any]] = {}
+        self.lock = threading.Lock()
+        self.counts = {'batches': 0, 'writes': 0, 'retries': 0, 'failed': 0}
+        self.external = 0
+        self._version: Optional[int] = None
+        self._checked = -math.inf
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._last = 0
+        self._thread = threading.Thread(target=self._run, name='db writer', daemon=True)
+        self._thread.start()
+        # Not to lose what's queued if the process exits without closing it
+        atexit.register(self.close)
+
+    def write(self, statements: list[Statement], pending: Optional[dict[Hashable, Any]] = None):
+        """Queues `statements` to be run together, reads get `pending` meanwhile"""
+        self._last += 1
+        if pending:
+            with self.lock:
+                self.pending.update((key, (self._last, value)) for key, value in pending.items())
+
+        self._queue.put((self._last, statements))
+
+    async def flush(self):
+        """Returns once everything written so far is committed, right away once it's closed"""
+        if not self._thread.is_alive():
+            return
+
+        future = Future()
+        self._queue.put(future)
+        await asyncio.wrap_future(future)
+
+    def close(self):
+        """Commits everything written so far and stops the thread, blocking until it's done"""
+        atexit.unregister(self.close)
+        self._queue.put(None)
+        self._thread.join()
+
+    def stats(self) -> dict[str, int]:
+        return {'queued': self._queue.qsize()} | self.counts
+
+    def _run(self):
+        connection = sqlite3.connect(self.path, timeout=TIMEOUT)
+        connection.execute('PRAGMA synchronous = FULL')
+        stopping = False
+        while not stopping:
+            batch: list[tuple[int, list[Statement]]] = []
+            flushed: list[Future] = []
+            try:
+                item = self._get(connection)
+                deadline = time.monotonic() + self.max_age
+                while True:
+                    if item is None:
+                        stopping = True
+                        break
+                    if isinstance(item, Future):
+                        flushed.append(item)
+                        break
+
+                    batch.append(item)
+                    if len(batch) >= self.max_batch:
+                        break
+                    try:
+                        item = self._get(connection, deadline)
+                    except queue.Empty:
+                        break
+
+                if batch:
+                    self._commit(connection, batch)
+
+            except Exception:
+                # Whatever it was, the thread has to keep going, or nothing after it is committed and
+                # flushing never returns
+                traceback.print_exc()
+                self.counts['failed'] += len(batch)
+
+            finally:
+                for future in flushed:
+                    future.set_result(None)
+
+        connection.close()
+
+    def _get(self, connection: sqlite3.Connection, deadline: float = math.inf) -> Any:
+        """The next thing queued, raises `queue.Empty` if there's none by `deadline`"""
+        while True:
+            self._check(connection)
+            try:
+                return self._queue.get(timeout=max(min(deadline - time.monotonic(), CHECK_EVERY), 0))
+            except queue.Empty:
+                if time.monotonic() >= deadline:
+                    raise
+
+    def _check(self, connection: sqlite3.Connection):
+        now = time.monotonic()
+        if now - self._checked < CHECK_EVERY:
+            return
+
+        self._checked = now
+        version = connection.execute('PRAGMA data_version').fetchone()[0]
+        if self._version is not None and version != self._version:
+            self.external += 1
+        self._version = version
+
+    def _commit(self, connection: sqlite3.Connection, batch: list[tuple[int, list[Statement]]]):
+        try:
+            for _ in range(RETRIES):
+                try:
+                    self._apply(connection, batch)
+                    break
+
+                except sqlite3.OperationalError:
+                    # e.g. another process kept it locked for too long
+                    traceback.print_exc()
+                    self.counts['retries'] += 1
+                    time.sleep(RETRY_DELAY)
+
+                except Exception:
+                    # e.g. a parameter SQLite can't take, which trying again won't change
+                    traceback.print_exc()
+                    self._apply_each(connection, batch)
+                    break
+
+            else:
+                self._apply_each(connection, batch)
+
+        finally:
+            last = batch[-1][0]
+            with self.lock:
+                for key in [key for key, (index, _) in self.pending.items() if index <= last]:
+                    del self.pending[key]
+
+    def _apply_each(self, connection: sqlite3.Connection, batch: list[tuple[int, list[Statement]]]):
+        """Commits the writes one by one, so the rest are committed without whatever keeps failing"""
+        for write in batch:
+            try:
+                self._apply(connection, [write])
+
+            except Exception:
+                traceback.print_exc()
+                self.counts['failed'] += 1
+
+    def _apply(self, connection: sqlite3.Connection, batch: list[tuple[int, list[Statement]]]):
+        with connection:
+            for _, statements in batch:
+                for sql, rows in statements:
+                    connection.executemany(sql, rows)
+
+        self.counts['batches'] += 1
+        self.counts['writes'] += len(batch)
+
+
+class SettingsTable:
+    """Users' settings, read through a cache of the `cache_size` users looked up last
+
+    They're read on every game, command and rehydrated session, so most reads are of the same few.
+    Writing updates the cache, and it's emptied once the writer sees another process has committed,
+    since anything in the table might have changed then. So what other processes write is read
+    within `CHECK_EVERY` seconds, and what this one writes doesn't empty it
+    """
+    def __init__(self, connection: sqlite3.Connection, writer: Writer, cache_size: int = SETTINGS_CACHED):
+        self.connection = connection
+        self.writer = writer
+        self.cache_size = cache_size
+        self._cache: OrderedDict[int, dict[str, int]] = OrderedDict()
+        self._external = writer.external
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, user_id: int) -> dict[str, int]:
+        """The user's settings, only the ones they've changed"""
+        if self.writer.external != self._external:
+            self._external = self.writer.external
+            self._cache.clear()
+
+        settings = self._cache.get(user_id)
+        if settings is not None:
+            self._hits += 1
+            self._cache.move_to_end(user_id)
+            return settings.copy()
+
+        self._misses += 1
+        pending = self.writer.pending.get(('settings', user_id))
+        if pending is not None:
+            settings = json.loads(pending[1])
+        else:
+            row = self.connection.execute('SELECT data FROM settings WHERE user_id = ?',
+                                          (user_id,)).fetchone()
+            settings = {} if row is None else json.loads(row[0])
+
+        self._remember(user_id, settings)
+        return settings.copy()
+
+    def set(self, user_id: int, name: str, value: int):
+        settings = self.get(user_id) | {name: value}
+        self.writer.write(
+            [(
+                'INSERT INTO settings VALUES (?, json_object(?, ?)) '
+                'ON CONFLICT (user_id) DO UPDATE SET data = json_set(data, ?, ?)',
+                [(user_id, name, value, f'$.{name}', value)]
+            )],
+            {('settings', user_id): json.dumps(settings)}
+        )  # yapf: disable
+        self._remember(user_id, settings)
+
+    def cache_info(self) -> CacheInfo:
+        return CacheInfo(self._hits, self._misses, self.cache_size, len(self._cache))
+
+    def _remember(self, user_id: int, settings: dict[str, int]):
+        self._cache[user_id] = settings
+        self._cache.move_to_end(user_id)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+
+class Leaderboard:
+    """Everyone's score on each mode, written by the modes' tables
+
+    Scores are only read once they're committed, which is within `MAX_AGE` seconds
+    """
+    def __init__(self, connection: sqlite3.Connection):
+        self.connection = connection
+
+    def modes(self) -> list[str]:
+        # Skips from one mode to the next on the index, instead of going through every score
+        return [
+            mode for mode, in self.connection.execute(
+                'WITH RECURSIVE modes (mode) AS ('
+                '    SELECT min(mode) FROM leaderboard'
+                '    UNION ALL SELECT (SELECT min(mode) FROM leaderboard WHERE mode > modes.mode) FROM modes'
+                '    WHERE mode IS NOT NULL'
+                ') SELECT mode FROM modes WHERE mode IS NOT NULL'
+            )
+        ]
+
+    def count(self, mode: str) -> int:
+        row = self.connection.execute('SELECT count(*) FROM leaderboard WHERE mode = ?', (mode,)).fetchone()
+        return row[0]
+
+    def top(self, mode: str, start: int, stop: int) -> list[tuple[int, int]]:
+        """User ids and scores ranked `start` to `stop` (from 0, best first)"""
+        return self.connection.execute(
+            'SELECT user_id, score FROM leaderboard WHERE mode = ? '
+            'ORDER BY score DESC, user_id LIMIT ? OFFSET ?', (mode, stop - start, start)
+        ).fetchall()
+
+    def median(self, mode: str) -> int:
+        count = self.count(mode)
+        if not count:
+            return 0
+
+        middle = [score for _, score in self.top(mode, (count - 1) // 2, count // 2 + 1)]
+        return int(sum(middle) / len(middle))
+
+    @staticmethod
+    def update(mode: str, scores: Iterable[tuple[int, int]]) -> Statement:
+        """Sets the users' scores, to be written along with what they're from"""
+        return 'INSERT OR REPLACE INTO leaderboard VALUES (?, ?, ?)', [(mode, *i) for i in scores]
+
+
+class ZenTable:
+    """Zen mode saves, their scores are put on the leaderboard along with them"""
+    def __init__(self, connection: sqlite3.Connection, writer: Writer):
+        self.connection = connection
+        self.writer = writer
+
+    def get(self, user_id: int) -> Optional[dict]:
+        pending = self.writer.pending.get(('zen', user_id))
+        if pending is not None:
+            return json.loads(pending[1])
+
+        row = self.connection.execute('SELECT save FROM zen WHERE user_id = ?', (user_id,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def all(self) -> dict[int, dict]:
+        """Every save that's been committed, by user id"""
+        return {user_id: json.loads(save) for user_id, save in self.connection.execute('SELECT * FROM zen')}
+
+    def save(self, user_id: int, save: dict):
+        self.save_all([(user_id, save)])
+
+    def save_all(self, saves: Iterable[tuple[int, dict]]):
+        """Saves over each user's last save, committed all at once"""
+        saves = [(user_id, save, json.dumps(save)) for user_id, save in saves]
+        self.writer.write(
+            [
+                ('INSERT OR REPLACE INTO zen VALUES (?, ?)', [(user_id, text) for user_id, _, text in saves]),
+                Leaderboard.update('zen', ((user_id, save.get('score', 0)) for user_id, save, _ in saves))
+            ],
+            {('zen', user_id): text for user_id, _, text in saves}
+        )  # yapf: disable
+
+
+class SessionTable:
+    """Records of open sessions (see `bot.lib.session`), by their message's id
+
+    The inputs of a session from before its last checkpoint are kept apart, a row per checkpoint
+    with the log leading up to it, since they're only written once and read once it ends
+    """
+    def __init__(self, connection: sqlite3.Connection, writer: Writer):
+        self.connection = connection
+        self.writer = writer
+
+    def __len__(self) -> int:
+        """How many are committed"""
+        return self.connection.execute('SELECT count(*) FROM sessions').fetchone()[0]
+
+    def get(self, message_id: int) -> Optional[dict]:
+        pending = self.writer.pending.get(('sessions', message_id))
+        if pending is not None:
+            # None once it's been removed
+            return None if pending[1] is None else json.loads(pending[1][1])
+
+        query = 'SELECT record FROM sessions WHERE message_id = ?'
+        row = self.connection.execute(query, (message_id,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def of_user(self, user_id: int) -> Optional[tuple[int, dict]]:
+        """The message id and record of one of the user's sessions, if they have any"""
+        with self.writer.lock:
+            pending = {
+                key[1]: value for key, (_, value) in self.writer.pending.items() if key[0] == 'sessions'
+            }
+
+        for message_id, value in pending.items():
+            if value is not None and value[0] == user_id:
+                return message_id, json.loads(value[1])
+
+        query = 'SELECT message_id, record FROM sessions WHERE user_id = ?'
+        for message_id, record in self.connection.execute(query, (user_id,)):
+            if message_id not in pending:
+                return message_id, json.loads(record)
+
+        return None
+
+    def logs(self, message_id: int) -> list[tuple[str, str]]:
+        """The session's encoded input logs leading up to each checkpoint, and the checkpoints' digests"""
+        with self.writer.lock:
+            pending = {
+                key[2]: value
+                for key, (_, value) in self.writer.pending.items()
+                if key[0] == 'session_logs' and key[1] == message_id
+            }
+
+        query = 'SELECT seq, log, checkpoint FROM session_logs WHERE message_id = ?'
+        logs = {seq: (log, digest) for seq, log, digest in self.connection.execute(query, (message_id,))}
+        return [value for _, value in sorted((logs | pending).items())]
+
+    def store(self, records: Iterable[tuple[int, dict]], logs: Iterable[tuple[int, int, str, str]] = ()):
+        """Stores records by their message id over the previous ones, and `logs` (message id, seq, log
+        and checkpoint digest) along with them, committed all at once
+        """
+        records = [(message_id, record['user_id'], json.dumps(record)) for message_id, record in records]
+        logs = list(logs)
+        statements = [
+            ('INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)', records),
+            ('INSERT OR REPLACE INTO session_logs VALUES (?, ?, ?, ?)', logs)
+        ]  # yapf: disable
+        pending = {('sessions', message_id): (user_id, text) for message_id, user_id, text in records}
+        pending.update(
+            (('session_logs', message_id, seq), (log, digest)) for message_id, seq, log, digest in logs
+        )
+        self.writer.write(statements, pending)
+
+    def remove(self, message_id: int):
+        """Removes the session and its logs, read them (see `logs`) first if they're still needed"""
+        statements = [
+            ('DELETE FROM sessions WHERE message_id = ?', [(message_id,)]),
+            ('DELETE FROM session_logs WHERE message_id = ?', [(message_id,)])
+        ]  # yapf: disable
+        self.writer.write(statements, {('sessions', message_id): None})
+
+
+class ReplayTable:
+    """Every finished session, enough to replay it (see `audit.py`)"""
+    def __init__(self, connection: sqlite3.Connection, writer: Writer):
+        self.connection = connection
+        self.writer = writer
+
+    def __iter__(self) -> Iterator[tuple[int, dict]]:
+        """Ids and records of the ones that are committed, oldest first"""
+        for replay_id, record in self.connection.execute('SELECT id, record FROM replays ORDER BY id'):
+            yield replay_id, json.loads(record)
+
+    def add(self, record: dict):
+        text = json.dumps(record)
+        statement = ('INSERT INTO replays (user_id, record) VALUES (?, ?)', [(record['user_id'], text)])
+        self.writer.write([statement], {('replays', record['user_id']): text})
+
+    def last(self, user_id: int) -> Optional[dict]:
+        pending = self.writer.pending.get(('replays', user_id))
+        if pending is not None:
+            return json.loads(pending[1])
+
+        row = self.connection.execute(
+            'SELECT record FROM replays WHERE user_id = ? ORDER BY id DESC LIMIT 1', (user_id,)
+        ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+
+class Database:
+    """Reads on the connection of whichever thread opened it, writes through a `Writer`, so `path`
+    has to be a file"""
+    def __init__(self, path: str = PATH):
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=TIMEOUT)
+        self.connection.execute('PRAGMA journal_mode = WAL')
+        self.connection.executescript(SCHEMA)
+        self.writer = Writer(path)
+        self.settings = SettingsTable(self.connection, self.writer)
+        self.leaderboard = Leaderboard(self.connection)
+        self.zen = ZenTable(self.connection, self.writer)
+        self.sessions = SessionTable(self.connection, self.writer)
+        self.replays = ReplayTable(self.connection, self.writer)
+
+    def size(self) -> int:
+        """Bytes on disk, with what's still only in the WAL"""
+        return sum(os.path.getsize(path) for path in (self.path, f'{self.path}-wal') if os.path.exists(path))
+
+    async def flush(self):
+        await self.writer.flush()
+
+    def close(self):
+        self.writer.close()
+        self.connection.close()
@@ -0,0 +1,200 @@
+"""Animated GIF replays, rendered by replaying a game's input log
+
+Frames are composited from a tile atlas (`atlas[cells]` and a reshape, no per pixel drawing) and
+only the cells that changed since the previous frame are encoded, as a sub-image at their offset.
+Frames are written as soon as the next one is known (that's when their delay is), so memory
+doesn't grow with the length of the game. Encoding is pure Python, so `send_replay` runs it in a
+worker process to keep it off the event loop
+"""
+import os
+import struct
+import tempfile
+from typing import BinaryIO
+
+import discord
+import numpy as np
+from numpy.typing import NDArray
+
+from bot.lib.game import Game
+from bot.lib.offload import Offload
+from bot.lib.replay import InputLog
+
+ROWS = 16
+# The palette has a fill and an edge colour per cell value, padded to 32 entries
+PALETTE_BITS = 5
+# Frames are shown for as long as it took to play the next action, within these (in ms)
+MIN_DELAY = 20
+MAX_DELAY = 500
+LAST_DELAY = 3000
+# Seconds a replay can take to render
+RENDER_TIMEOUT = 120
+
+
+def rgb(color: int) -> NDArray[np.float64]:
+    return np.array([color >> 16, color >> 8 & 0xff, color & 0xff], dtype=np.float64)
+
+
+def atlas(colors: tuple[int, ...], size: int) -> tuple[NDArray[np.uint8], bytes]:
+    """The tiles for every cell value as palette indices (`(10, size, size)`) and the palette
+
+    Tiles are filled squares with a darker edge, except for empty cells and the ghost, which are
+    the background with an edge in their own colour
+    """
+    background = rgb(colors[0])
+    palette = np.zeros((1 << PALETTE_BITS, 3))
+    for i, color in enumerate(colors):
+        if i == 0:
+            palette[0], palette[1] = background, background + 12
+        elif i == 9:
+            palette[18], palette[19] = background, rgb(color)
+        else:
+            palette[i * 2], palette[i * 2 + 1] = rgb(color), rgb(color) * 0.6
+
+    values = np.arange(len(colors), dtype=np.uint8)[:, None, None]
+    tiles = np.empty((len(colors), size, size), dtype=np.uint8)
+    tiles[:] = values * 2 + 1
+    tiles[:, 1:-1, 1:-1] = values * 2
+    return tiles, np.clip(palette, 0, 255).astype(np.uint8).tobytes()
+
+
+def lzw(data: bytes, min_size: int) -> bytes:
+    """GIF flavoured LZW, variable width codes of up to 12 bits packed LSB first"""
+    clear = 1 << min_size
+    size = min_size + 1
+    next_code = clear + 2
+    codes: dict[int, int] = {}
+    out = bytearray()
+    buffer = clear
+    bits = size
+    prefix = data[0]
+    for byte in data[1:]:
+        key = prefix << 8 | byte
+        code = codes.get(key)
+        if code is not None:
+            prefix = code
+            continue
+
+        buffer |= prefix << bits
+        bits += size
+        if next_code >= 1 << size and size < 12:
+            size += 1
+
+        if next_code < 4096:
+            codes[key] = next_code
+            next_code += 1
+        else:
+            buffer |= clear << bits
+            bits += size
+            codes.clear()
+            size = min_size + 1
+            next_code = clear + 2
+
+        while bits >= 8:
+            out.append(buffer & 0xff)
+            buffer >>= 8
+            bits -= 8
+
+        prefix = byte
+
+    buffer |= prefix << bits
+    bits += size
+    if next_code >= 1 << size and size < 12:
+        size += 1
+
+    buffer |= (clear + 1) << bits
+    bits += size
+    out += buffer.to_bytes((bits + 7) // 8, 'little')
+    return bytes(out)
+
+
+class GifWriter:
+    """Streams an animated GIF into `fp` one frame at a time
+
+    Frames are palette indices covering any rectangle of the image, drawn over what's there
+    """
+    def __init__(self, fp: BinaryIO, width: int, height: int, palette: bytes):
+        self.fp = fp
+        # Global colour table of 2 ** PALETTE_BITS entries, looping forever
+        fp.write(b'GIF89a' + struct.pack('<HHBBB', width, height, 0xf0 | PALETTE_BITS - 1, 0, 0))
+        fp.write(palette)
+        fp.write(b'\x21\xff\x0bNETSCAPE2.0\x03\x01\x00\x00\x00')
+
+    def frame(self, pixels: NDArray[np.uint8], x: int, y: int, delay: int):
+        """Writes `pixels` at `(x, y)` (in pixels, x being the column), shown for `delay` ms"""
+        height, width = pixels.shape
+        self.fp.write(b'\x21\xf9\x04' + struct.pack('<BHBB', 1 << 2, delay // 10, 0, 0))
+        self.fp.write(b'\x2c' + struct.pack('<HHHHB', x, y, width, height, 0))
+        self.fp.write(bytes([PALETTE_BITS]))
+        data = lzw(pixels.tobytes(), PALETTE_BITS)
+        for i in range(0, len(data), 255):
+            block = data[i:i + 255]
+            self.fp.write(bytes([len(block)]) + block)
+
+        self.fp.write(b'\x00')
+
+    def close(self):
+        self.fp.write(b'\x3b')
+
+
+def drawn_cells(game: Game) -> NDArray[np.int8]:
+    """The visible rows of `game`'s board with the piece and its ghost drawn in"""
+    cells = game.board.cells[-ROWS:].copy()
+    top = len(game.board.cells) - ROWS
+    piece = game.current_piece
+    for value, piece_cells in ((9, piece.ghost_cells), (piece.type, piece.cells)):
+        for x, y in piece_cells:
+            if x >= top:
+                cells[x - top, y] = value
+
+    return cells
+
+
+def write_replay(fp: BinaryIO, game: Game, log: InputLog, colors: tuple[int, ...], tile: int = 8) -> int:
+    """Plays `log` on `game` (which should be as it was when the log started) and writes it to `fp`
+    as a GIF with a frame per action that changed what's shown, returns how many frames there are
+    """
+    tiles, palette = atlas(colors, tile)
+    writer = GifWriter(fp, 10 * tile, ROWS * tile, palette)
+    shown = drawn_cells(game)
+    pending = (tiles[shown].transpose(0, 2, 1, 3).reshape(ROWS * tile, -1), 0, 0)
+    delay = 0
+    frames = 1
+    for action, wait in zip(log, log.delays):
+        delay += wait
+        game.apply(action)
+        cells = drawn_cells(game)
+        changed = cells != shown
+        if not changed.any():
+            continue
+
+        writer.frame(*pending, min(max(delay, MIN_DELAY), MAX_DELAY))
+        rows = np.flatnonzero(changed.any(1))
+        cols = np.flatnonzero(changed.any(0))
+        area = cells[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1]
+        pixels = tiles[area].transpose(0, 2, 1, 3).reshape(len(area) * tile, -1)
+        pending = (pixels, int(cols[0]) * tile, int(rows[0]) * tile)
+        shown = cells
+        delay = 0
+        frames += 1
+
+    writer.frame(*pending, LAST_DELAY)
+    writer.close()
+    return frames
+
+
+def _export(game: Game, log: str, colors: tuple[int, ...]) -> str:
+    with tempfile.NamedTemporaryFile(suffix='.gif', delete=False) as fp:
+        write_replay(fp, game, InputLog.decode(log), colors)
+
+    return fp.name
+
+
+async def send_replay(
+    offload: Offload, channel: discord.abc.Messageable, game: Game, log: InputLog, colors: tuple[int, ...]
+):
+    """Renders a replay in a worker process (see `write_replay`) and sends it to `channel`"""
+    path = await offload.run(RENDER_TIMEOUT, _export, game, log.encode(), colors, discard=os.remove)
+    try:
+        await channel.send(file=discord.File(path, filename='replay.gif'))
+    finally:
+        os.remove(path)
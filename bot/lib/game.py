@@ -1,6 +1,5 @@
-import dataclasses
 import enum
-import math
+from random import Random
 from random import SystemRandom
 from typing import NamedTuple, Optional
 
@@ -8,11 +7,19 @@ import discord
 import numpy as np
 from numpy.typing import NDArray
 
+from bot.lib import skins
 from bot.lib.consts import SHAPES
 from bot.lib.consts import SRS_I_KICKS
 from bot.lib.consts import SRS_KICKS
 
 Pieces = enum.Enum('PIECES', 'I L J S Z T O')
+Actions = enum.IntEnum(
+    'ACTIONS', [
+        'NONE', 'MOVE_LEFT', 'MOVE_RIGHT', 'CHARGE_LEFT', 'CHARGE_RIGHT', 'ROTATE_CW', 'ROTATE_CCW',
+        'ROTATE_180', 'SOFT_DROP', 'HARD_DROP', 'SWAP', 'RESET', 'UNDO', 'REDO'
+    ],
+    start=0
+)
 random = SystemRandom()
 
 
@@ -28,92 +35,316 @@ class Position(NamedTuple):
         return Position(x=self.x + x, y=self.y + y)
 
 
-@dataclasses.dataclass()
-class Frame:
-    pos: Position
+class Frame(NamedTuple):
+    x: int
+    y: int
     rot: int
 
     @property
-    def x(self) -> int:
-        return self.pos.x
-
-    @property
-    def y(self) -> int:
-        return self.pos.y
+    def pos(self) -> Position:
+        return Position(self.x, self.y)
 
     def __add__(self, other: 'Frame') -> 'FrameDelta':
         if not isinstance(other, Frame):
             return NotImplemented
 
-        return FrameDelta(previous=self, current=other)
+        return FrameDelta(other.x - self.x, other.y - self.y, other.rot - self.rot)
 
 
-@dataclasses.dataclass()
-class FrameDelta:
-    previous: Frame
-    current: Frame
+class FrameDelta(NamedTuple):
+    x: int = 0
+    y: int = 0
+    rotation: int = 0
+
+
+class Shape(NamedTuple):
+    """Everything about a piece in a given rotation, relative to its position
+
+    `masks` holds `(row_offset, bitmask)` pairs, `bottom` holds `(column_offset, row_offset)`
+    of the lowest cell in every column the piece covers, and `x_range`/`y_range` are the
+    positions that keep the piece inside a 30x10 board
+    """
+    cells: tuple[tuple[int, int], ...]
+    masks: tuple[tuple[int, int], ...]
+    bounds: tuple[int, int, int, int]
+    bottom: tuple[tuple[int, int], ...]
+    x_range: range
+    y_range: range
+
+
+def _build_shape_table() -> tuple[tuple[Shape, ...], ...]:
+    table = []
+    for rotations in SHAPES:
+        shapes = []
+        for cells in rotations:
+            masks: dict[int, int] = {}
+            bottom: dict[int, int] = {}
+            for sx, sy in cells:
+                masks[sx] = masks.get(sx, 0) | 1 << sy
+                bottom[sy] = max(bottom.get(sy, sx), sx)
+
+            xs, ys = zip(*cells)
+            shapes.append(
+                Shape(
+                    cells=tuple(cells),
+                    masks=tuple(sorted(masks.items())),
+                    bounds=(min(xs), max(xs), min(ys), max(ys)),
+                    bottom=tuple(sorted(bottom.items())),
+                    x_range=range(-min(xs), 30 - max(xs)),
+                    y_range=range(-min(ys), 10 - max(ys))
+                )
+            )
 
-    @property
-    def x(self) -> int:
-        return self.current.x - self.previous.x
+        table.append(tuple(shapes))
+
+    return tuple(table)
 
-    @property
-    def y(self) -> int:
-        return self.current.y - self.previous.y
+
+# Indexed by [piece_type - 1][rotation]
+SHAPE_TABLE = _build_shape_table()
+
+
+class BitBoard:
+    """Board backend storing every row as a bitmask
+
+    Bit `y` of `rows[x]` is set when the cell at `(x, y)` is filled, all collision,
+    line clear and corner checks are done on these, while `cells` keeps the actual
+    piece types for rendering and encoding (and is what `np.asarray(board)` returns)
+
+    `tops` is the skyline, the highest filled row of each column (or the board height
+    if it's empty), kept up to date on placement so drops don't need to probe row by row
+    """
+    __slots__ = ('cells', 'full_row', 'rows', 'tops')
+
+    def __init__(self, cells: Optional[NDArray[np.int8]] = None):
+        if cells is None:
+            cells = np.zeros((30, 10), dtype=np.int8)
+
+        self.cells = cells
+        self.full_row = (1 << cells.shape[1]) - 1
+        self.rows: list[int] = ((cells != 0) @ (1 << np.arange(cells.shape[1]))).tolist()
+        self.tops: list[int] = []
+        self.update_tops()
+
+    def __array__(self, dtype=None, copy=None) -> NDArray[np.int8]:
+        if dtype is not None:
+            return self.cells.astype(dtype)
+
+        return self.cells
 
     @property
-    def rotation(self) -> int:
-        return self.current.rot - self.previous.rot
+    def shape(self) -> tuple[int, int]:
+        return self.cells.shape
+
+    def any(self) -> bool:
+        return any(self.rows)
+
+    def copy(self) -> 'BitBoard':
+        return BitBoard(self.cells.copy())
+
+    def filled(self, x: int, y: int) -> int:
+        # Indices wrap around like they would on the array
+        return self.rows[x] >> y % self.cells.shape[1] & 1
+
+    def overlaps(self, t: int, x: int, y: int, r: int) -> bool:
+        shape = SHAPE_TABLE[t - 1][r]
+        min_x, max_x, _, _ = shape.bounds
+        if y not in shape.y_range or x + min_x < 0 or x + max_x >= len(self.rows):
+            return True
+
+        rows = self.rows
+        for sx, mask in shape.masks:
+            if rows[x + sx] & (mask << y if y >= 0 else mask >> -y):
+                return True
+
+        return False
+
+    def t_corners(self, x: int, y: int, r: int) -> tuple[int, bool]:
+        """How many corners around a T at `(x, y)` are filled, and whether both of its front corners are
+
+        Corners past the floor or the right wall count as filled
+        """
+        max_x, max_y = self.cells.shape
+        filled = self.filled
+        if x + 2 < max_x and y + 2 < max_y:
+            corners = filled(x, y) + filled(x + 2, y) + filled(x, y + 2) + filled(x + 2, y + 2)
+
+        elif x + 2 > max_x and y + 2 < max_y:
+            corners = 2
+            corners += filled(x, y) + filled(x, y + 2)
+
+        elif x + 2 < max_x and y + 2 > max_y:
+            corners = 2
+            corners += filled(x, y) + filled(x + 2, y)
+
+        else:
+            corners = 3
+            corners += filled(x, y)
+
+        front_corner_offsets = [
+            ((x, y), (x, y + 2)),          # ▒▒██▒▒ <- these corners
+            ((x, y + 2), (x + 2, y + 2)),  # ██████
+            ((x + 2, y), (x + 2, y + 2)),
+            ((x, y), (x + 2, y))
+        ]  # yapf: disable
+        (ax, ay), (bx, by) = front_corner_offsets[r]
+        return corners, bool(filled(ax, ay) and filled(bx, by))
+
+    def update_tops(self):
+        filled = self.cells != 0
+        self.tops = np.where(filled.any(0), filled.argmax(0), len(self.rows)).tolist()
+
+    def slide(self, t: int, x: int, y: int, r: int, dx: int, dy: int, limit: int) -> int:
+        """How many `(dx, dy)` steps the piece can take, up to `limit`"""
+        for step in range(limit):
+            x += dx
+            y += dy
+            if self.overlaps(t, x, y, r):
+                return step
+
+        return limit
+
+    def drop_distance(self, t: int, x: int, y: int, r: int) -> int:
+        """How many rows the piece can fall, straight from the skyline when possible"""
+        tops = self.tops
+        distance = len(self.rows)
+        for sy, sx in SHAPE_TABLE[t - 1][r].bottom:
+            gap = tops[y + sy] - x - sx - 1
+            if gap < 0:
+                # Tucked under something, the skyline doesn't help here
+                return self.slide(t, x, y, r, 1, 0, len(self.rows))
+
+            if gap < distance:
+                distance = gap
+
+        return distance
+
+    def wall_distance(self, t: int, x: int, y: int, r: int, direction: int) -> int:
+        """How many columns the piece can move left (`direction < 0`) or right until it hits something"""
+        width = self.cells.shape[1]
+        distance = width
+        rows = self.rows
+        for sx, mask in SHAPE_TABLE[t - 1][r].masks:
+            mask = mask << y if y >= 0 else mask >> -y
+            row = rows[x + sx]
+            if row & mask:
+                # Already overlapping the stack (e.g. swapped into a blocked spawn), so it's stuck
+                return 0
+
+            if direction < 0:
+                left = (mask & -mask).bit_length() - 1
+                gap = left - (row & (1 << left) - 1).bit_length()
+            else:
+                right = mask.bit_length()
+                blockers = row >> right
+                gap = (blockers & -blockers).bit_length() - 1 if blockers else width - right
+
+            if gap < distance:
+                distance = gap
+
+        return distance
+
+    def place(self, t: int, x: int, y: int, r: int):
+        tops = self.tops
+        for sx, sy in SHAPE_TABLE[t - 1][r].cells:
+            self.cells[x + sx, y + sy] = t
+            self.rows[x + sx] |= 1 << y + sy
+            if x + sx < tops[y + sy]:
+                tops[y + sy] = x + sx
+
+    def clear_lines(self) -> tuple[int, ...]:
+        """Clears all full rows in a single pass, in-place, returning their indices"""
+        full_row = self.full_row
+        rows = self.rows
+        cleared = tuple(i for i, row in enumerate(rows) if row == full_row)
+        if not cleared:
+            return cleared
+
+        count = len(cleared)
+        kept = [i for i, row in enumerate(rows) if row != full_row]
+        self.cells[count:] = self.cells[kept]
+        self.cells[:count] = 0
+        rows[:] = [0] * count + [rows[i] for i in kept]
+
+        # Rows only ever move down, so the new top of a column is at or below the old one
+        height = len(rows)
+        for col, top in enumerate(self.tops):
+            while top < height and not rows[top] >> col & 1:
+                top += 1
+
+            self.tops[col] = top
+
+        return cleared
 
 
 class Piece:
-    def __init__(self, board: NDArray[np.int8], t: int, x: int = 10, y: int = 3, r: int = 0):
-        self.board = board
+    """A piece on a board
+
+    Position, rotation and how the last move that changed either moved it (its `delta`) are plain
+    ints in slots, so moving allocates nothing. `pos`, `frame` and `delta` are built when asked for
+    """
+    __slots__ = ('board', 'type', '_x', '_y', '_rot', '_dx', '_dy', '_drot')
+
+    def __init__(self, board: BitBoard, t: int, x: int = 10, y: int = 3, r: int = 0):
+        self.board = board if isinstance(board, BitBoard) else BitBoard(board)
         self.type = t
-        self.pos = Position(x, y)
+        self._x = x
+        self._y = y
         self._rot = r
-        self.frame = Frame(pos=self.pos, rot=self.rot)
-        self.delta = None
+        # A piece that hasn't moved yet has an empty delta, so dropping it in place scores nothing
+        self._dx = self._dy = self._drot = 0
+
+    @property
+    def pos(self) -> Position:
+        return Position(self._x, self._y)
 
-    def new_frame(self):
-        new = Frame(pos=self.pos, rot=self.rot)
-        if new != self.frame:
-            self.delta = self.frame + Frame(pos=self.pos, rot=self.rot)
-            self.frame = new
+    @pos.setter
+    def pos(self, value: tuple[int, int]):
+        self._x, self._y = value
+
+    @property
+    def frame(self) -> Frame:
+        return Frame(self._x, self._y, self._rot)
+
+    @property
+    def delta(self) -> FrameDelta:
+        return FrameDelta(self._dx, self._dy, self._drot)
+
+    @delta.setter
+    def delta(self, value: FrameDelta):
+        self._dx, self._dy, self._drot = value
 
     @property
     def x(self) -> int:
-        return self.pos[0]
+        return self._x
 
     @x.setter
     def x(self, value: int):
-        target = self.x
-        step = int(math.copysign(1, value - self.x))
-        for _ in range(abs(self.x - value)):
-            if Piece(self.board, self.type, target + step, self.y, self.rot).overlaps():
-                break
-
-            target += step
+        x = self._x
+        if value > x:
+            moved = min(value - x, self.board.drop_distance(self.type, x, self._y, self._rot))
+        else:
+            moved = -self.board.slide(self.type, x, self._y, self._rot, -1, 0, x - value)
 
-        self.pos = Position(target, self.y)
-        self.new_frame()
+        if moved:
+            self._x = x + moved
+            self._dx, self._dy, self._drot = moved, 0, 0
 
     @property
     def y(self) -> int:
-        return self.pos[1]
+        return self._y
 
     @y.setter
     def y(self, value: int):
-        target = self.y
-        step = int(math.copysign(1, value - self.y))
-        for _ in range(abs(self.y - value)):
-            if Piece(self.board, self.type, self.x, target + step, self.rot).overlaps():
-                break
-
-            target += step
+        y = self._y
+        if value > y:
+            moved = min(value - y, self.board.wall_distance(self.type, self._x, y, self._rot, +1))
+        else:
+            moved = -min(y - value, self.board.wall_distance(self.type, self._x, y, self._rot, -1))
 
-        self.pos = Position(self.x, target)
-        self.new_frame()
+        if moved:
+            self._y = y + moved
+            self._dx, self._dy, self._drot = 0, moved, 0
 
     @property
     def rot(self) -> int:
@@ -123,38 +354,40 @@ class Piece:
     def rot(self, value: int):
         value %= 4
         previous = self._rot
-        if Piece(self.board, self.type, self.x, self.y, value).overlaps():
-            kick_table = SRS_I_KICKS if self.type == Pieces.I else SRS_KICKS
-            for x, y in kick_table[previous][value]:
-                if not Piece(self.board, self.type, self.x + x, self.y + y, value).overlaps():
-                    self.pos = Position(self.x + x, self.y + y)
+        x, y = self._x, self._y
+        kick_x = kick_y = 0
+        if self.board.overlaps(self.type, x, y, value):
+            kick_table = SRS_I_KICKS if self.type == Pieces.I.value else SRS_KICKS
+            for kick_x, kick_y in kick_table[previous][value]:
+                if not self.board.overlaps(self.type, x + kick_x, y + kick_y, value):
                     break
             else:
                 return
 
-        self._rot = value
-        self.new_frame()
+        if kick_x or kick_y or value != previous:
+            self._x, self._y, self._rot = x + kick_x, y + kick_y, value
+            self._dx, self._dy, self._drot = kick_x, kick_y, value - previous
 
     @property
-    def shape(self) -> NDArray[np.int8]:
-        return np.array(SHAPES[self.type - 1][self.rot], dtype=np.int8)
-
-    def copy(self):
-        return Piece(self.board, self.type, self.x, self.y, self.rot)
+    def shape(self) -> tuple[tuple[int, int], ...]:
+        return SHAPE_TABLE[self.type - 1][self.rot].cells
 
-    def overlaps(self) -> bool:
-        board = self.board
-        for sx, sy in self.shape + self.pos:
-            if not 0 <= sx < board.shape[0]:
-                return True
+    @property
+    def cells(self) -> tuple[tuple[int, int], ...]:
+        x, y = self._x, self._y
+        return tuple((x + sx, y + sy) for sx, sy in SHAPE_TABLE[self.type - 1][self._rot].cells)
 
-            if not 0 <= sy < board.shape[1]:
-                return True
+    @property
+    def ghost_cells(self) -> tuple[tuple[int, int], ...]:
+        x, y = self._x, self._y
+        x += self.board.drop_distance(self.type, x, y, self._rot)
+        return tuple((x + sx, y + sy) for sx, sy in SHAPE_TABLE[self.type - 1][self._rot].cells)
 
-            if board[sx, sy]:
-                return True
+    def copy(self):
+        return Piece(self.board, self.type, self._x, self._y, self._rot)
 
-        return False
+    def overlaps(self) -> bool:
+        return self.board.overlaps(self.type, self._x, self._y, self._rot)
 
     def __add__(self, other):
         if isinstance(other, tuple):
@@ -172,9 +405,14 @@ class Piece:
 
 
 class Queue:
-    def __init__(self, initial_queue: list[int] = [], initial_bag: list[int] = []):
+    __slots__ = ('rng', '_queue', '_bag')
+
+    def __init__(
+        self, initial_queue: list[int] = [], initial_bag: list[int] = [], rng: Optional[Random] = None
+    ):
+        self.rng = rng or random
         self._queue = initial_queue[:4]
-        self._bag = initial_bag
+        self._bag = initial_bag[:]
         for _ in range(4):
             if len(self._queue) < 4:
                 self._queue.append(self._next_piece())
@@ -182,7 +420,7 @@ class Queue:
     def _next_piece(self) -> int:
         if not self._bag:
             self._bag = [i.value for i in Pieces]
-            random.shuffle(self._bag)
+            self.rng.shuffle(self._bag)
 
         return self._bag.pop()
 
@@ -200,11 +438,82 @@ class Queue:
         return piece
 
 
+class BoardRenderer:
+    """Renders the bottom `rows` rows of boards as emoji text
+
+    Each row's text is kept along with the cells it was rendered from (with the piece and ghost
+    drawn in), and only rows whose cells differ from last time are rendered again, which is
+    usually just the few the piece moved through. Those are looked up in the compiled skin's
+    row table (see `bot.lib.skins`), which is shared by everything rendering with that skin
+    """
+    __slots__ = ('skin', 'rows', '_skin', '_keys', '_texts')
+
+    def __init__(self, skin: int, rows: int = 16):
+        self.skin = skin
+        self.rows = rows
+        self._skin: Optional[skins.Skin] = None
+        self._keys: list[Optional[bytes]] = [None] * rows
+        self._texts = [''] * rows
+
+    def render(self, cells: NDArray[np.int8], piece: Optional[Piece] = None) -> str:
+        top = len(cells) - self.rows
+        width = cells.shape[1]
+        data = cells[top:].tobytes()
+        keys = [data[i:i + width] for i in range(0, len(data), width)]
+        if piece is not None:
+            drawn: dict[int, bytearray] = {}
+            for value, piece_cells in ((9, piece.ghost_cells), (piece.type, piece.cells)):
+                for x, y in piece_cells:
+                    if x >= top:
+                        row = drawn.get(x - top)
+                        if row is None:
+                            row = drawn[x - top] = bytearray(keys[x - top])
+
+                        row[y] = value
+
+            for i, row in drawn.items():
+                keys[i] = bytes(row)
+
+        skin = skins.get(self.skin)
+        if skin is not self._skin:
+            # The skins were reloaded, nothing rendered with the old one can be kept
+            self._skin = skin
+            self._keys = [None] * self.rows
+
+        for i, key in enumerate(keys):
+            if key != self._keys[i]:
+                self._keys[i] = key
+                self._texts[i] = skin.row(key)
+
+        return '\n'.join(self._texts)
+
+
 class Game:
-    def __init__(self, config: dict, user_settings: dict):
-        self.emotes = config['skins'][user_settings.get('skin', 0)]['pieces']
-        self.queue = Queue()
-        self.board = np.zeros((30, 10), dtype=np.int8)
+    ACTIONS = {
+        Actions.MOVE_LEFT: ('drag', -1),
+        Actions.MOVE_RIGHT: ('drag', +1),
+        Actions.CHARGE_LEFT: ('drag', -10),
+        Actions.CHARGE_RIGHT: ('drag', +10),
+        Actions.ROTATE_CW: ('rotate', +1),
+        Actions.ROTATE_CCW: ('rotate', -1),
+        Actions.ROTATE_180: ('rotate', 2),
+        Actions.SOFT_DROP: ('soft_drop',),
+        Actions.HARD_DROP: ('hard_drop',),
+        Actions.SWAP: ('swap',),
+        Actions.RESET: ('restart',),
+        Actions.UNDO: ('undo',),
+        Actions.REDO: ('redo',)
+    }
+
+    def __init__(self, config: dict, user_settings: dict, seed: Optional[int] = None):
+        skins.load(config)
+        self.skin: int = user_settings.get('skin', 0)
+        self.renderer = BoardRenderer(self.skin)
+        # Every bag is drawn from this, so the same seed and inputs always play out the same
+        self.seed = random.getrandbits(64) if seed is None else seed
+        self.rng = Random(self.seed)
+        self.queue = Queue(rng=self.rng)
+        self.board = BitBoard()
         self.current_piece = Piece(self.board, self.queue.pop())
         self.score = 0
         self.hold: Optional[int] = None
@@ -214,10 +523,12 @@ class Game:
         self.b2b = 0
         self.action_text: Optional[str] = None
         self.can_pc = False
+        # Counts the actions applied, so a render can tell whether it's still the latest
+        self.version = 0
 
     def reset(self):
-        self.queue = Queue()
-        self.board = np.zeros((30, 10), dtype=np.int8)
+        self.queue = Queue(rng=self.rng)
+        self.board = BitBoard()
         self.current_piece = Piece(self.board, self.queue.pop())
         self.previous_score = self.score
         self.hold = None
@@ -227,55 +538,29 @@ class Game:
         self.action_text: str = None
         self.can_pc = False
 
+    def restart(self):
+        """Resets the game when the player asks to, unlike topping out"""
+        self.reset()
+
     def lock_piece(self):
         if not self.can_pc:
             self.can_pc = True
 
         piece = self.current_piece
-        for sx, sy in piece.shape + piece.pos:
-            self.board[sx, sy] = piece.type
+        self.board.place(piece.type, piece.x, piece.y, piece.rot)
 
         tspin = False
-        if self.current_piece.type == Pieces.T.value:
-            x, y = self.current_piece.pos
-            max_x, max_y = self.board.shape
-            if x + 2 < max_x and y + 2 < max_y:
-                corners = sum(self.board[(x, x + 2, x, x + 2), (y, y, y + 2, y + 2)] != 0)
-
-            elif x + 2 > max_x and y + 2 < max_y:
-                corners = 2
-                corners += sum(self.board[(x, x), (y, y + 2)] != 0)
-
-            elif x + 2 < max_x and y + 2 > max_y:
-                corners = 2
-                corners += sum(self.board[(x, x + 2), (y, y)] != 0)
-
-            else:
-                corners = 3
-                corners += self.board[x, y] != 0
-
-            if corners >= 3 and self.current_piece.delta.rotation:
+        if piece.type == Pieces.T.value:
+            corners, front_corners = self.board.t_corners(piece.x, piece.y, piece.rot)
+            if corners >= 3 and piece.delta.rotation:
                 tspin = True
-                front_corner_offsets = [
-                    ((x, x), (y, y + 2)),          # ▒▒██▒▒ <- these corners
-                    ((x, x + 2), (y + 2, y + 2)),  # ██████
-                    ((x + 2, x + 2), (y, y + 2)),
-                    ((x, x + 2), (y, y))
-                ]  # yapf: disable
-
                 # Only is a mini if a front corner isn't present and it wasn't a X -> +2 kick
-                mini_spin = not np.all(
-                    self.board[front_corner_offsets[self.current_piece.rot]] != 0
-                ) and self.current_piece.delta.x < 2
-
-        line_clears = 0
-        for row, clear in enumerate(self.board.all(1)):
-            if clear:
-                self.board[row] = 0
-                self.board = np.concatenate(
-                    (np.roll(self.board[:row + 1], shift=1, axis=0), self.board[row + 1:])
-                )
-                line_clears += 1
+                mini_spin = not front_corners and piece.delta.x < 2
+
+        cleared_rows = self.board.clear_lines()
+        line_clears = len(cleared_rows)
+        # Nothing can be empty after placing a piece unless something was cleared
+        perfect_clear = line_clears > 0 and not self.board.any()
 
         if tspin:
             if mini_spin:
@@ -320,7 +605,7 @@ class Game:
             self.score += 50 * (self.combo - 1)
             self.action_text = f'{self.action_text} + Combo {self.combo - 1}x'
 
-        if not self.board.any():
+        if perfect_clear:
             self.score += [0, 700, 900, 1200, 1200][line_clears]
             if self.b2b > 1:
                 self.score += 2000
@@ -329,13 +614,14 @@ class Game:
 
         if self.action_text:
             self.action_text += '!' * (
-                line_clears // 2 + (self.combo > 1) + (self.b2b > 1) + tspin + (not self.board.any())
+                line_clears // 2 + (self.combo > 1) + (self.b2b > 1) + tspin + perfect_clear
             )
 
-        for sx, sy in self.current_piece.shape + self.current_piece.pos:
+        for sx, sy in self.current_piece.cells:
             if sx < 10:
                 self.reset()
                 self.action_text = 'Top out!'
+                break
 
         self.current_piece = Piece(self.board, self.queue.pop())
         self.hold_lock = False
@@ -345,17 +631,7 @@ class Game:
             self.action_text = 'Block out!'
 
     def get_board_text(self) -> str:
-        board = self.board.copy()
-        piece = self.current_piece
-        ghost = piece.copy()
-        ghost.x += 30
-        for sx, sy in ghost.shape + ghost.pos:
-            board[sx, sy] = 9
-
-        for sx, sy in piece.shape + piece.pos:
-            board[sx, sy] = piece.type
-
-        return '\n'.join(''.join(self.emotes[j] for j in i) for i in board[14:])
+        return self.renderer.render(self.board.cells, self.current_piece)
 
     def get_embed(self) -> discord.Embed:
         embed = discord.Embed(
@@ -368,6 +644,12 @@ class Game:
         embed.add_field(name='Score', value=f'**{self.score:,}**\n+{self.score - self.previous_score}')
         return embed
 
+    def apply(self, action: Actions):
+        if action != Actions.NONE:
+            method, *args = self.ACTIONS[action]
+            getattr(self, method)(*args)
+            self.version += 1
+
     def drop(self, height: int):
         self.current_piece.x += height
 
@@ -397,5 +679,23 @@ class Game:
     def drag(self, dist: int):
         self.current_piece.y += dist
 
+    @property
+    def can_undo(self) -> bool:
+        return False
+
+    @property
+    def can_redo(self) -> bool:
+        return False
+
+    def undo(self):
+        """Does nothing, only modes keeping a history (like zen) can be undone"""
+
+    def redo(self):
+        """Does nothing, only modes keeping a history (like zen) can be redone"""
+
+    def initial(self, config: dict) -> 'Game':
+        """A new game as this one was when it started, so replaying its inputs on it plays it again"""
+        return Game(config, {}, seed=self.seed)
+
     def to_save(self):
         return NotImplemented
@@ -0,0 +1,184 @@
+import base64
+import hashlib
+import json
+import random
+import sys
+from array import array
+from collections import deque
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from bot.lib.game import BitBoard
+from bot.lib.game import FrameDelta
+from bot.lib.game import Game
+from bot.lib.game import Piece
+from bot.lib.game import Queue
+
+
+class Snapshot(NamedTuple):
+    """Everything about a game that an action can change, in a few hundred bytes
+
+    `board` is the cells from the highest filled row down as bytes, which is the same object as the
+    previous snapshot's when nothing was placed in between. `piece` is its type, x, y, rotation and
+    delta x, y and rotation, so a T-spin undone and played again still counts
+    """
+    board: bytes
+    piece: tuple[int, int, int, int, int, int, int]
+    queue: tuple[int, ...]
+    bag: tuple[int, ...]
+    hold: Optional[int]
+    hold_lock: bool
+    score: int
+    previous_score: int
+    combo: int
+    b2b: int
+    action_text: Optional[str]
+    can_pc: bool
+
+    @staticmethod
+    def take(game: Game, previous: Optional['Snapshot'] = None) -> 'Snapshot':
+        board = game.board.cells[min(game.board.tops):].tobytes()
+        if previous is not None and previous.board == board:
+            board = previous.board
+
+        piece = game.current_piece
+        return Snapshot(
+            board, (piece.type, piece.x, piece.y, piece.rot, *piece.delta), tuple(game.queue.next_pieces),
+            tuple(game.queue.current_bag), game.hold, game.hold_lock, game.score, game.previous_score,
+            game.combo, game.b2b, game.action_text, game.can_pc
+        )
+
+    def encode(self) -> list:
+        return [base64.b64encode(self.board).decode(), *self[1:]]
+
+    @staticmethod
+    def decode(encoded: list, previous: Optional['Snapshot'] = None) -> 'Snapshot':
+        board = base64.b64decode(encoded[0])
+        if previous is not None and previous.board == board:
+            board = previous.board
+
+        piece, queue, bag, *rest = encoded[1:]
+        return Snapshot(board, tuple(piece), tuple(queue), tuple(bag), *rest)
+
+    def restore(self, game: Game):
+        """Puts `game` back how it was, except for its random generator, so bags drawn after this can
+        differ from the ones drawn before (replaying the same inputs still plays out the same)
+        """
+        height, width = game.board.cells.shape
+        cells = np.zeros((height, width), dtype=np.int8)
+        rows = len(self.board) // width
+        cells[height - rows:] = np.frombuffer(self.board, dtype=np.int8).reshape(rows, width)
+        game.board = BitBoard(cells)
+
+        t, x, y, r, *delta = self.piece
+        game.current_piece = Piece(game.board, t, x, y, r)
+        game.current_piece.delta = FrameDelta(*delta)
+
+        game.queue = Queue(initial_queue=list(self.queue), initial_bag=list(self.bag), rng=game.rng)
+        game.hold = self.hold
+        game.hold_lock = self.hold_lock
+        game.score = self.score
+        game.previous_score = self.previous_score
+        game.combo = self.combo
+        game.b2b = self.b2b
+        game.action_text = self.action_text
+        game.can_pc = self.can_pc
+
+
+class History:
+    """The last `depth` snapshots of a game to undo to, and the ones undone since to redo
+
+    Once there are more than `depth` snapshots the oldest one is dropped, and doing anything
+    other than undoing or redoing clears everything that could be redone
+    """
+    __slots__ = ('undos', 'redos')
+
+    def __init__(self, depth: int):
+        self.undos: deque[Snapshot] = deque(maxlen=depth)
+        self.redos: deque[Snapshot] = deque(maxlen=depth)
+
+    def save(self, game: Game):
+        """Records `game` as it is right before changing it"""
+        self.undos.append(Snapshot.take(game, self.undos[-1] if self.undos else None))
+        self.redos.clear()
+
+    def undo(self, game: Game):
+        if self.undos:
+            self.redos.append(Snapshot.take(game, self.undos[-1]))
+            self.undos.pop().restore(game)
+
+    def redo(self, game: Game):
+        if self.redos:
+            self.undos.append(Snapshot.take(game, self.redos[-1]))
+            self.redos.pop().restore(game)
+
+
+class Checkpoint(NamedTuple):
+    """A game as it is after some inputs, along with what replaying them would rebuild too: its undo
+    history and random generator. So it can be picked up from here instead of replaying them all
+
+    `rng` is the generator's state as little-endian uint32s
+    """
+    snapshot: Snapshot
+    undos: tuple[Snapshot, ...]
+    redos: tuple[Snapshot, ...]
+    rng: bytes
+    gauss: Optional[float]
+
+    @staticmethod
+    def take(game: Game) -> 'Checkpoint':
+        _, state, gauss = game.rng.getstate()
+        words = array('I', state)
+        if sys.byteorder != 'little':
+            words.byteswap()
+
+        undos = tuple(game.history.undos)
+        return Checkpoint(
+            Snapshot.take(game, undos[-1] if undos else None), undos, tuple(game.history.redos),
+            words.tobytes(), gauss
+        )
+
+    def restore(self, game: Game):
+        """Puts `game` back how it was, its random generator included"""
+        self.snapshot.restore(game)
+        game.history.undos.clear()
+        game.history.undos.extend(self.undos)
+        game.history.redos.clear()
+        game.history.redos.extend(self.redos)
+
+        words = array('I')
+        words.frombytes(self.rng)
+        if sys.byteorder != 'little':
+            words.byteswap()
+        game.rng.setstate((random.Random.VERSION, tuple(words), self.gauss))
+
+    def digest(self) -> str:
+        """A hash of all of it, to check a replay goes through it without storing it"""
+        return hashlib.blake2b(json.dumps(self.encode()).encode(), digest_size=16).hexdigest()
+
+    def encode(self) -> dict:
+        return {
+            'snapshot': self.snapshot.encode(),
+            'undos': [snapshot.encode() for snapshot in self.undos],
+            'redos': [snapshot.encode() for snapshot in self.redos],
+            'rng': base64.b64encode(self.rng).decode(),
+            'gauss': self.gauss
+        }
+
+    @staticmethod
+    def decode(encoded: dict) -> 'Checkpoint':
+        undos = _decode_all(encoded['undos'])
+        snapshot = Snapshot.decode(encoded['snapshot'], undos[-1] if undos else None)
+        return Checkpoint(
+            snapshot, undos, _decode_all(encoded['redos']), base64.b64decode(encoded['rng']), encoded['gauss']
+        )
+
+
+def _decode_all(encoded: list[list]) -> tuple[Snapshot, ...]:
+    # Each one shares its board with the one before if it's the same
+    snapshots = []
+    for data in encoded:
+        snapshots.append(Snapshot.decode(data, snapshots[-1] if snapshots else None))
+
+    return tuple(snapshots)
@@ -0,0 +1,71 @@
+"""How far behind the event loop is
+
+A timer checks how late it fires every `interval` seconds, which is how late everything else on the
+loop (e.g. a button press) gets handled too. Firing `threshold` seconds late or more is counted as a
+slow step and printed, so anything blocking the loop for over `threshold + interval` seconds is.
+Which callback it was is only known to asyncio's debug mode, which `debug` turns on: it then logs
+every callback that takes over `threshold` seconds along with what it ran, but every callback costs
+a bit more
+"""
+import asyncio
+import statistics
+from collections import deque
+from typing import Optional
+
+INTERVAL = 0.05
+THRESHOLD = 0.1
+# Delays kept for `stats`, a couple of minutes' worth
+KEEP = 2400
+
+
+class LagMonitor:
+    def __init__(self, interval: float = INTERVAL, threshold: float = THRESHOLD, debug: bool = False):
+        self.interval = interval
+        self.threshold = threshold
+        self.debug = debug
+        self.delays: deque[float] = deque(maxlen=KEEP)
+        self.slow_steps = 0
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # The loop's own debug settings, put back on `stop`
+        self._loop_debug: Optional[tuple[bool, float]] = None
+
+    def start(self):
+        """Starts measuring, on the running loop"""
+        self.stop()
+        self._loop = asyncio.get_running_loop()
+        self._task = self._loop.create_task(self._measure())
+        if self.debug:
+            self._loop_debug = self._loop.get_debug(), self._loop.slow_callback_duration
+            self._loop.slow_callback_duration = self.threshold
+            self._loop.set_debug(True)
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._loop_debug is not None:
+            debug, self._loop.slow_callback_duration = self._loop_debug
+            self._loop.set_debug(debug)
+            self._loop_debug = None
+
+    def stats(self) -> dict[str, float]:
+        """How late the timer fired (in ms) lately, and how many times it was a slow step so far"""
+        delays = sorted(self.delays) or [0.0]
+        return {
+            'median': statistics.median(delays) * 1000,
+            'p99': delays[int(len(delays) * 0.99)] * 1000,
+            'max': delays[-1] * 1000,
+            'slow steps': self.slow_steps
+        }
+
+    async def _measure(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            delay = loop.time() - expected
+            self.delays.append(delay)
+            if delay >= self.threshold:
+                self.slow_steps += 1
+                print(f'The event loop was blocked for over {delay * 1000:.0f} ms', flush=True)
@@ -1,9 +1,13 @@
 import base64
+import functools
 from typing import Optional
 
 import numpy as np
 from numpy.typing import NDArray
 
+from bot.lib import skins
+from bot.lib.db import CacheInfo
+from bot.lib.game import BoardRenderer
 from bot.lib.game import Piece
 
 
@@ -25,6 +29,7 @@ class Encoder:
     """
     @staticmethod
     def encode(board: NDArray[int], piece: Optional[Piece] = None) -> str:
+        board = np.asarray(board)
         pairs = []
         for i, j in enumerate(board):
             if j.any():
@@ -94,3 +99,30 @@ class Encoder:
                     board[-1, j - 1] = 0
 
         return board, piece
+
+
+@functools.lru_cache(maxsize=256)
+def decode(encoded: str) -> tuple[NDArray[np.int8], Optional[Piece]]:
+    """`Encoder.decode`, cached, so the board and piece are shared by every caller (and the board is
+    read-only to keep it that way)
+    """
+    board, piece = Encoder.decode(encoded)
+    board.flags.writeable = False
+    return board, piece
+
+
+@functools.lru_cache(maxsize=512)
+def _render(encoded: str, skin_id: int, skin: skins.Skin) -> str:
+    return BoardRenderer(skin_id).render(*decode(encoded))
+
+
+def render(encoded: str, skin_id: int) -> str:
+    """A map string rendered as board text with a skin, cached
+
+    The compiled skin is part of the key, so reloading the config doesn't serve stale text
+    """
+    return _render(encoded, skin_id, skins.get(skin_id))
+
+
+def cache_info() -> dict[str, CacheInfo]:
+    return {'decode': CacheInfo(*decode.cache_info()), 'render': CacheInfo(*_render.cache_info())}
@@ -0,0 +1,98 @@
+"""CPU-bound work run in worker processes, so it doesn't hold up the event loop (and every game with it)
+
+Only work that takes far longer than sending its arguments and result over is worth it: rendering a
+replay is, a single move isn't (see `bot.lib.lag` for what's holding up the loop). Calls are refused
+once `max_pending` are running or waiting for a worker, and given up on after their timeout
+"""
+import asyncio
+from concurrent.futures import Future
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional, TypeVar
+
+from discord.ext import commands
+
+T = TypeVar('T')
+
+WORKERS = 2
+MAX_PENDING = 8
+
+
+class Overloaded(commands.CheckFailure):
+    pass
+
+
+class Offload:
+    """A pool of `workers` processes, started on the first call"""
+    def __init__(self, workers: int = WORKERS, max_pending: int = MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.counts = {'done': 0, 'refused': 0, 'timed out': 0, 'failed': 0}
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    async def run(
+        self,
+        timeout: float,
+        fn: Callable[..., T],
+        *args: Any,
+        discard: Optional[Callable[[T], Any]] = None
+    ) -> T:
+        """Returns `fn(*args)` as run by a worker, raises `Overloaded` if it's refused or takes longer
+        than `timeout` seconds
+
+        Calls that time out still run to the end if they'd started, and keep their place meanwhile.
+        `discard` is passed what they return then (e.g. to clean up files they made)
+        """
+        if self.pending >= self.max_pending:
+            self.counts['refused'] += 1
+            raise Overloaded("I've got too much to do right now, try again in a bit!")
+
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self.workers)
+
+        loop = asyncio.get_running_loop()
+        future = self._pool.submit(fn, *args)
+        self.pending += 1
+        timed_out = False
+
+        def done(future: Future):
+            self.pending -= 1
+            if timed_out and discard is not None and not future.cancelled() and future.exception() is None:
+                discard(future.result())
+
+        def done_threadsafe(future: Future):
+            # Unless the bot's shut down and the loop's closed meanwhile
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(done, future)
+
+        future.add_done_callback(done_threadsafe)
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+
+        except asyncio.TimeoutError as e:
+            timed_out = True
+            self.counts['timed out'] += 1
+            raise Overloaded('That took too long, sorry!') from e
+
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory), the next call starts a new pool
+            self._pool = None
+            self.counts['failed'] += 1
+            raise
+
+        except Exception:
+            self.counts['failed'] += 1
+            raise
+
+        self.counts['done'] += 1
+        return result
+
+    def stats(self) -> dict[str, int]:
+        return {'pending': self.pending} | self.counts
+
+    def shutdown(self):
+        """Lets the workers go once they're done with what they have"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
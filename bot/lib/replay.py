@@ -0,0 +1,67 @@
+import base64
+import sys
+import time
+from array import array
+from typing import Iterator
+
+from bot.lib.game import Actions
+from bot.lib.game import Game
+
+
+class InputLog:
+    """Append-only record of every action played in a game, and when it was played
+
+    Each entry is one byte for the action and two for the milliseconds since the
+    previous one (capped at ~65 seconds), `encode` packs all actions followed by
+    all timings into a single base64 string:
+        data ::= <base64 encoded: [action, ...][little-endian uint16 delay, ...]>
+    """
+    def __init__(self, actions: bytes = b'', delays: bytes = b''):
+        self.actions = bytearray(actions)
+        self.delays = array('H')
+        self.delays.frombytes(delays)
+        if sys.byteorder != 'little':
+            self.delays.byteswap()
+
+        self._last = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self.actions)
+
+    def __iter__(self) -> Iterator[Actions]:
+        return map(Actions, self.actions)
+
+    def append(self, action: Actions):
+        now = time.monotonic()
+        self.actions.append(action)
+        self.delays.append(min(int((now - self._last) * 1000), 0xffff))
+        self._last = now
+
+    def extend(self, other: 'InputLog'):
+        """Appends what's in `other`, with its timings"""
+        self.actions += other.actions
+        self.delays.extend(other.delays)
+
+    def encode(self) -> str:
+        delays = array('H', self.delays)
+        if sys.byteorder != 'little':
+            delays.byteswap()
+
+        return base64.b64encode(bytes(self.actions) + delays.tobytes()).decode()
+
+    @staticmethod
+    def decode(encoded: str) -> 'InputLog':
+        data = base64.b64decode(encoded)
+        if len(data) % 3:
+            raise ValueError('Invalid input log')
+
+        count = len(data) // 3
+        return InputLog(data[:count], data[count:])
+
+
+def replay(game: Game, log: InputLog) -> Game:
+    """Plays every action of `log` on `game` as fast as possible, ignoring timings"""
+    for action in log:
+        game.apply(action)
+
+    return game
@@ -0,0 +1,331 @@
+"""Sends every game message edit, so rate limits are shared fairly between all running games
+
+Each game has at most one frame pending, which is only rendered when it's sent, so a game that's
+played faster than it can be shown just skips frames. Pending games are sent oldest shown frame
+first. Edits go straight to the API (not through discord.py, which retries rate limits on its own)
+so the per-channel buckets and the global limit are tracked from the responses' headers
+"""
+import asyncio
+import time
+import traceback
+from collections import deque
+from typing import Any, Coroutine, Optional, TYPE_CHECKING
+
+import aiohttp
+import discord
+from discord.ext import commands
+
+if TYPE_CHECKING:
+    from bot.lib.session import Session
+
+# Interactions have to be responded to within 3 seconds of being sent, pending ones get deferred
+# past this many so they're never left unanswered
+RESPOND_WITHIN = 2.0
+# Requests per second across every route, unless the API says otherwise with a global 429. The
+# second is counted a bit longer here since requests don't all take as long to get there
+GLOBAL_LIMIT = 50
+GLOBAL_PERIOD = 1.05
+# How long a channel is waited on after a 429 that says nothing about when to retry, like the HTML
+# ones from Cloudflare
+RETRY_AFTER = 1.0
+# Status, headers and body
+Response = tuple[int, dict[str, str], Any]
+
+
+class Transport:
+    """Sends message payloads with the bot's token, returning the response's status, headers and body"""
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    async def edit(self, channel_id: int, message_id: int, payload: dict) -> Response:
+        return await self.request('PATCH', f'/channels/{channel_id}/messages/{message_id}', payload)
+
+    async def respond(self, interaction_id: int, token: str, payload: dict) -> Response:
+        """Responds to an interaction on a message by editing it"""
+        data = {'type': discord.InteractionResponseType.message_update.value, 'data': payload}
+        return await self.request('POST', f'/interactions/{interaction_id}/{token}/callback', data)
+
+    async def request(self, method: str, path: str, payload: dict) -> Response:
+        if self.session is None:
+            self.session = aiohttp.ClientSession(headers={'Authorization': f'Bot {self.bot.http.token}'})
+
+        async with self.session.request(method, self.bot.config['api_base'] + path, json=payload) as response:
+            body = await response.json() if response.content_type == 'application/json' else None
+            return response.status, dict(response.headers), body
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+
+class Bucket:
+    """A channel's message edit rate limit, as of the last response (`limit` is 1 until there is one)
+
+    Requests sent since then are counted as taken until they're answered
+    """
+    __slots__ = ('limit', 'remaining', 'reset_at', 'in_flight')
+
+    def __init__(self):
+        self.limit = 1
+        self.remaining = 1
+        self.reset_at = 0.0
+        self.in_flight = 0
+
+    def free_at(self, now: float) -> float:
+        """When a request can be sent, `now` if it can right away"""
+        if now >= self.reset_at:
+            return now if self.limit > self.in_flight else float('inf')
+
+        return now if self.remaining > self.in_flight else self.reset_at
+
+    def update(self, headers: dict[str, str], now: float):
+        if 'X-RateLimit-Remaining' in headers:
+            self.limit = int(headers.get('X-RateLimit-Limit', self.limit))
+            self.remaining = int(headers['X-RateLimit-Remaining'])
+            self.reset_at = now + float(headers['X-RateLimit-Reset-After'])
+
+
+def rate_limited(headers: dict[str, str], body: Any) -> tuple[bool, Optional[float]]:
+    """Whether a 429 is global, and how many seconds to wait before retrying if it says"""
+    if isinstance(body, dict) and 'retry_after' in body:
+        return bool(body.get('global')), float(body['retry_after'])
+
+    is_global = headers.get('X-RateLimit-Global', '').lower() == 'true'
+    for name in ('Retry-After', 'X-RateLimit-Reset-After'):
+        if name in headers:
+            return is_global, float(headers[name])
+
+    return is_global, None
+
+
+class Entry:
+    """A game's place in the scheduler"""
+    __slots__ = ('session', 'pending', 'interaction', 'in_flight', 'shown_at')
+
+    def __init__(self, session: 'Session'):
+        self.session = session
+        self.pending = False
+        self.interaction: Optional[discord.Interaction] = None
+        self.in_flight = False
+        self.shown_at = 0.0
+
+
+class EditScheduler:
+    """Shows games' new states on their message as fast as rate limits allow, oldest frame first
+
+    A frame that's for an interaction still in time is sent as its response instead, which isn't
+    rate limited per channel. Frames of a game are at least `edit_window` seconds apart
+    """
+    def __init__(self, bot: commands.Bot, transport: Optional[Transport] = None):
+        self.bot = bot
+        self.transport = transport or Transport(bot)
+        self.entries: dict[int, Entry] = {}
+        self.buckets: dict[int, Bucket] = {}
+        self.global_reset = 0.0
+        self._sent_times: deque[float] = deque(maxlen=GLOBAL_LIMIT)
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        # Frames being sent and interactions being deferred, kept so they aren't garbage collected
+        self._tasks: set[asyncio.Task] = set()
+        self.closed = False
+        self.counts = {'sent': 0, 'dropped': 0, 'rate limited': 0, 'failed': 0}
+
+    def submit(self, session: 'Session', interaction: Optional[discord.Interaction] = None):
+        """Has `session`'s game shown as it'll be when its turn comes, through `interaction` if possible
+
+        If it already had a frame waiting, that one's dropped, and its interaction deferred
+        """
+        entry = self.entries.get(id(session))
+        if entry is None:
+            entry = self.entries[id(session)] = Entry(session)
+
+        if entry.pending:
+            self.counts['dropped'] += 1
+
+        if interaction is not None:
+            if entry.interaction is not None:
+                self._defer(entry.interaction)
+
+            entry.interaction = interaction
+
+        entry.pending = True
+        if self.closed:
+            return
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+        self._wake.set()
+
+    def stats(self) -> dict[str, int]:
+        queued = sum(entry.pending for entry in self.entries.values())
+        in_flight = sum(entry.in_flight for entry in self.entries.values())
+        return {'queued': queued, 'in flight': in_flight} | self.counts
+
+    async def close(self):
+        """Stops sending frames and waits for the ones being sent, pending ones are kept (see `pending`)"""
+        self.closed = True
+        if self._task is not None:
+            self._task.cancel()
+        if self._tasks:
+            await asyncio.wait(self._tasks)
+
+        await self.transport.close()
+
+    def pending(self) -> list[tuple['Session', Optional[discord.Interaction]]]:
+        """Every open session with a frame waiting, and the interaction it's for"""
+        return [(entry.session, entry.interaction)
+                for entry in self.entries.values()
+                if entry.pending and not entry.session.closed]
+
+    def _defer(self, interaction: discord.Interaction):
+        if not interaction.response.is_done():
+            self._start(interaction.response.defer())
+
+    def _start(self, coro: Coroutine):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._done)
+
+    def _done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        error = None if task.cancelled() else task.exception()
+        if error is not None:
+            traceback.print_exception(type(error), error, error.__traceback__)
+
+    async def _run(self):
+        while True:
+            self._wake.clear()
+            timeout = self._dispatch()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _dispatch(self) -> Optional[float]:
+        """Starts sending every pending frame that can be sent now, returns how long until the next
+        one can (None if that's only once something changes)
+        """
+        now = time.monotonic()
+        wake = float('inf')
+        edit_window = self.bot.config['edit_window']
+        pending = []
+        for key, entry in list(self.entries.items()):
+            # Also while its previous frame is being sent, which can take longer than there's left
+            if entry.interaction is not None:
+                sent_at = discord.utils.snowflake_time(entry.interaction.id).timestamp()
+                deadline = now + (sent_at + RESPOND_WITHIN - time.time())
+                if now >= deadline:
+                    self._defer(entry.interaction)
+                    entry.interaction = None
+                else:
+                    wake = min(wake, deadline)
+
+            if entry.in_flight:
+                continue
+            if entry.session.closed:
+                del self.entries[key]
+            elif entry.pending:
+                pending.append(entry)
+
+        for entry in sorted(pending, key=lambda entry: entry.shown_at):
+            ready_at = entry.shown_at + edit_window
+            if now < ready_at:
+                wake = min(wake, ready_at)
+                continue
+
+            if entry.interaction is None:
+                bucket = self.buckets.setdefault(entry.session.channel_id, Bucket())
+                free_at = max(bucket.free_at(now), self.global_reset, self._global_free_at())
+                if free_at > now:
+                    wake = min(wake, free_at)
+                    continue
+
+                bucket.in_flight += 1
+                self._sent_times.append(now)
+
+            entry.pending = False
+            entry.in_flight = True
+            self._start(self._send(entry, entry.interaction))
+            entry.interaction = None
+
+        return None if wake == float('inf') else wake - now
+
+    def _global_free_at(self) -> float:
+        if len(self._sent_times) < GLOBAL_LIMIT:
+            return 0.0
+
+        return self._sent_times[0] + GLOBAL_PERIOD
+
+    async def _send(self, entry: Entry, interaction: Optional[discord.Interaction]):
+        session = entry.session
+        bucket = None if interaction is not None else self.buckets[session.channel_id]
+        responded = False
+        try:
+            async with session.lock:
+                payload = session.frame()
+                if payload is None:
+                    if interaction is not None:
+                        self._defer(interaction)
+                    return
+
+                if interaction is not None:
+                    status, _, _ = await self.transport.respond(interaction.id, interaction.token, payload)
+                    responded = status < 400
+                    if status >= 400:
+                        # It's shown with a regular edit instead
+                        self.counts['failed'] += 1
+                        session.sent(None)
+                        entry.pending = True
+                        return
+
+                else:
+                    status, headers, body = await self.transport.edit(
+                        session.channel_id, session.message_id, payload
+                    )
+                    now = time.monotonic()
+                    bucket.update(headers, now)
+                    if status == 429:
+                        self.counts['rate limited'] += 1
+                        is_global, retry_after = rate_limited(headers, body)
+                        if is_global and retry_after is not None:
+                            self.global_reset = now + retry_after
+                        else:
+                            bucket.remaining = 0
+                            bucket.reset_at = max(bucket.reset_at, now + (retry_after or RETRY_AFTER))
+
+                        session.sent(None)
+                        entry.pending = True
+                        return
+
+                    if status >= 400:
+                        self.counts['failed'] += 1
+                        session.sent(None)
+                        # Tried again unless it's the request that's wrong (e.g. the message is gone)
+                        if status >= 500:
+                            entry.pending = True
+                            entry.shown_at = now
+                        return
+
+                session.sent(payload)
+                entry.shown_at = time.monotonic()
+                self.counts['sent'] += 1
+
+        except Exception:
+            # The frame's tried again after `edit_window`, whatever went wrong (e.g. a timeout, a body
+            # that isn't JSON or an error rendering it)
+            traceback.print_exc()
+            self.counts['failed'] += 1
+            session.sent(None)
+            entry.pending = True
+            entry.shown_at = time.monotonic()
+            if interaction is not None and not responded:
+                self._defer(interaction)
+
+        finally:
+            if bucket is not None:
+                bucket.in_flight -= 1
+
+            entry.in_flight = False
+            self._wake.set()
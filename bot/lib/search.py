@@ -0,0 +1,212 @@
+from enum import IntEnum
+from typing import NamedTuple
+
+from bot.lib.consts import SRS_I_KICKS
+from bot.lib.consts import SRS_KICKS
+from bot.lib.game import Piece
+from bot.lib.game import Pieces
+from bot.lib.game import SHAPE_TABLE
+
+
+class Spins(IntEnum):
+    NONE = 0
+    MINI = 1
+    FULL = 2
+
+
+class Placement(NamedTuple):
+    x: int
+    y: int
+    rot: int
+    spin: Spins
+
+
+# What the last move was, which decides whether locking there is a spin (see `Game.lock_piece`)
+MOVED = 0
+KICKED = 1  # Rotated with a kick that moved it 2 or more rows down, so it can't be a mini
+ROTATED = 2
+
+# Sets of columns are bitmasks with bit `y + Y_OFFSET` set for column `y`, since pieces can
+# sit up to 2 columns past the left wall and kicks can push them 2 more
+Y_OFFSET = 4
+
+
+def _build_search_tables() -> tuple[list, list, list]:
+    """Per piece type and rotation, the columns it can be at, which rotation it looks the same as and
+    where turning it can take it
+
+    `canonical[t][r]` is `(rot, dx, dy)` such that the piece at `(x + dx, y + dy, rot)` covers
+    the same cells, with `rot` being the first rotation that does so. `turns[t][r]` has a
+    `(index, last_move, kicks)` for every turn, `index` being what to add to a state's
+    `x << 2 | rot` to turn it in place, and `kicks` having `(index, up, down, last_move)` for each
+    kick, where columns `y` the piece fits at after the kick are `fits << Y_OFFSET >> up` and the
+    columns it kicks to are `kicked << Y_OFFSET >> down`
+    """
+    columns = []
+    canonical = []
+    turns = []
+    for t, shapes in enumerate(SHAPE_TABLE, start=1):
+        columns.append([sum(1 << y + Y_OFFSET for y in shape.y_range) for shape in shapes])
+
+        normalized = []
+        rotations = []
+        for shape in shapes:
+            min_x = min(sx for sx, _ in shape.cells)
+            min_y = min(sy for _, sy in shape.cells)
+            cells = frozenset((sx - min_x, sy - min_y) for sx, sy in shape.cells)
+            same = next((i for i, (other, _, _) in enumerate(normalized) if other == cells), len(normalized))
+            normalized.append((cells, min_x, min_y))
+            _, same_x, same_y = normalized[same]
+            rotations.append((same, min_x - same_x, min_y - same_y))
+
+        canonical.append(rotations)
+
+        # Turning an O only changes what `rot` says, and only the T cares about how it got somewhere
+        is_t = t == Pieces.T.value
+        kick_table = SRS_I_KICKS if t == Pieces.I.value else SRS_KICKS
+        piece_turns = []
+        for r in range(4):
+            piece_turns.append([])
+            if t == Pieces.O.value:
+                continue
+
+            for value in ((r + 1) % 4, (r - 1) % 4, (r + 2) % 4):
+                kicks = []
+                for kx, ky in kick_table[r][value]:
+                    last = (KICKED if kx >= 2 else ROTATED) * is_t
+                    kicks.append(((kx << 2) + value - r, Y_OFFSET + ky, Y_OFFSET - ky, last))
+
+                piece_turns[r].append((value - r, ROTATED * is_t, kicks))
+
+        turns.append(piece_turns)
+
+    return columns, canonical, turns
+
+
+COLUMNS, CANONICAL, TURNS = _build_search_tables()
+
+
+def placements(piece: Piece) -> list[Placement]:
+    """Every distinct placement `piece` can be locked at using the moves on the controls
+
+    This is a BFS from the piece's current position over taps left/right, the three rotations
+    (with kicks), soft drops (so tucks under overhangs are found) and hard drops. Rather than one
+    position at a time, states are a row and rotation with a bitmask of columns, so a whole row of
+    taps, drops or kicks is a few shifts. Placements covering the same cells with the same spin
+    (like an I in either horizontal rotation) are only returned once. Charges aren't searched
+    since they're just repeated taps
+    """
+    board = piece.board
+    rows = board.rows
+    height = len(rows)
+    t = piece.type
+    shapes = SHAPE_TABLE[t - 1]
+    columns = COLUMNS[t - 1]
+    canonical = CANONICAL[t - 1]
+    turns = TURNS[t - 1]
+
+    # Columns the piece fits at, per `x << 2 | rot`, so one row down is 4 more. Kicks can reach 2 rows
+    # past the floor, which is left as not fitting
+    fits = [0] * (height + 3 << 2)
+    for x in range(height):
+        for r, shape in enumerate(shapes):
+            min_x, max_x, _, _ = shape.bounds
+            if x + min_x >= 0 and x + max_x < height:
+                blocked = 0
+                for sx, sy in shape.cells:
+                    blocked |= rows[x + sx] << Y_OFFSET >> sy
+
+                fits[x << 2 | r] = columns[r] & ~blocked
+
+    found: dict[tuple[int, int, int, Spins], Placement] = {}
+
+    def lock(x: int, r: int, last: int, ys: int):
+        rot, dx, dy = canonical[r]
+        while ys:
+            y = (ys & -ys).bit_length() - 1 - Y_OFFSET
+            ys &= ys - 1
+            spin = Spins.NONE
+            if last:
+                corners, front_corners = board.t_corners(x, y, r)
+                if corners >= 3:
+                    spin = Spins.MINI if not front_corners and last == ROTATED else Spins.FULL
+
+            key = (x + dx, y + dy, rot, spin)
+            if key not in found:
+                found[key] = Placement(x, y, r, spin)
+
+    # Columns reached, expanded and locked per `x << 2 | rot` (and `<< 2 | last_move` for locks). The
+    # last move only matters when hard dropping right away, so that's done as soon as a state is reached,
+    # and everything else is expanded per row and rotation, queued once at a time to get as many columns
+    # as possible at once
+    reached = [0] * len(fits)
+    expanded = [0] * len(fits)
+    locked = [0] * (len(fits) << 2)
+    queued = [False] * len(fits)
+    pending = []
+
+    def visit(key: int, last: int, ys: int):
+        resting = ys & ~fits[key + 4] & ~locked[key << 2 | last]
+        if resting:
+            locked[key << 2 | last] |= resting
+            lock(key >> 2, key & 3, last, resting)
+
+        if ys & ~reached[key]:
+            reached[key] |= ys
+            if not queued[key]:
+                queued[key] = True
+                pending.append(key)
+
+    last = MOVED
+    if t == Pieces.T.value and piece.delta.rotation:
+        last = KICKED if piece.delta.x >= 2 else ROTATED
+
+    visit(piece.x << 2 | piece.rot, last, 1 << piece.y + Y_OFFSET)
+    for key in pending:
+        queued[key] = False
+        ys = reached[key] & ~expanded[key]
+        expanded[key] = reached[key]
+        r = key & 3
+
+        # Taps, spreading along the row for as long as the piece fits
+        here = fits[key]
+        spread = (ys << 1 | ys >> 1) & here
+        while spread:
+            grown = (spread | spread << 1 | spread >> 1) & here
+            if grown == spread:
+                visit(key, MOVED, spread)
+                break
+
+            spread = grown
+
+        # Drops, a soft drop stops wherever a hard drop would lock or 5 rows down, whichever is first
+        falling = ys & fits[key + 4]
+        for below in range(key + 4, key + 20, 4):
+            if not falling:
+                break
+
+            landed = falling & ~fits[below + 4]
+            if landed:
+                visit(below, MOVED, landed)
+                falling ^= landed
+        else:
+            if falling:
+                visit(key + 20, MOVED, falling)
+
+        for index, rotated, kicks in turns[r]:
+            target = fits[key + index]
+            turned = ys & target
+            if turned:
+                visit(key + index, rotated, turned)
+
+            blocked = ys ^ turned
+            for index, up, down, kicked in kicks:
+                if not blocked:
+                    break
+
+                target = fits[key + index] << Y_OFFSET >> up & blocked
+                if target:
+                    visit(key + index, kicked, target << Y_OFFSET >> down)
+                    blocked ^= target
+
+    return list(found.values())
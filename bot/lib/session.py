@@ -0,0 +1,282 @@
+"""Open games, kept in memory while they're being played and only in the db otherwise
+
+A session is stored as what its game started from plus its input log, so it's rehydrated by
+replaying the log, which rebuilds its undo history and random generator exactly as they were. Every
+`CHECKPOINT_EVERY` inputs the game is checkpointed (see `Checkpoint`) and the log starts over from
+there, so neither the record nor rehydrating grows with how long it's been played. The logs leading
+up to each checkpoint are stored once apart from it, so the whole game can still be replayed from
+its seed once it ends (see `Sessions.full_log`). Stored sessions are keyed by their message's id,
+which is all a button press needs to find them
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Iterable, Optional
+
+import discord
+from discord.ext import commands
+
+from bot.lib.controls import components
+from bot.lib.controls import LAYOUTS
+from bot.lib.game import Actions
+from bot.lib.game import Game
+from bot.lib.history import Checkpoint
+from bot.lib.replay import InputLog
+from bot.lib.replay import replay
+
+# Game types by the name sessions are stored with, they're passed what they started from first
+# (e.g. `ZenGame`) and register themselves here
+MODES: dict[str, type[Game]] = {}
+# Inputs logged before the game is checkpointed, replaying this many takes about 4 ms
+CHECKPOINT_EVERY = 250
+
+
+class Session:
+    """A game being played on a message, and the inputs played on it since `checkpoint` (or its start)"""
+    __slots__ = (
+        'mode', 'game', 'user_id', 'channel_id', 'message_id', 'layout', 'footer', 'log', 'checkpoint',
+        'segments', 'stored', 'inputs', 'lock', 'last_active', 'closed', '_shown', '_version'
+    )
+
+    def __init__(
+        self,
+        mode: str,
+        game: Game,
+        user_id: int,
+        channel_id: int,
+        message_id: int,
+        layout: int = 0,
+        footer: tuple[str, Optional[str]] = ('', None),
+        log: Optional[InputLog] = None,
+        checkpoint: Optional[Checkpoint] = None,
+        stored: int = 0
+    ):
+        self.mode = mode
+        self.game = game
+        self.user_id = user_id
+        self.channel_id = channel_id
+        self.message_id = message_id
+        self.layout = layout if 0 <= layout < len(LAYOUTS) else 0
+        # The player's name and avatar
+        self.footer = footer
+        self.log = InputLog() if log is None else log
+        self.checkpoint = checkpoint
+        # The encoded logs up to each checkpoint since the session was last stored, and the
+        # checkpoints' digests, `stored` more are in the db before them
+        self.segments: list[tuple[str, str]] = []
+        self.stored = stored
+        self.inputs: deque[Actions] = deque()
+        # Held by the scheduler from rendering a frame until it's sent
+        self.lock = asyncio.Lock()
+        self.last_active = time.monotonic()
+        self.closed = False
+        self._shown: Optional[dict] = None
+        self._version: Optional[int] = None
+
+    @staticmethod
+    def start(
+        mode: str, game: Game, author: discord.abc.User, message: discord.Message, layout: int
+    ) -> 'Session':
+        footer = (str(author), author.display_avatar.url)
+        return Session(mode, game, author.id, message.channel.id, message.id, layout, footer)
+
+    def play(self, action: Actions):
+        """Queues `action`, it's applied when the game's next frame is rendered (see `frame`)"""
+        self.log.append(action)
+        self.inputs.append(action)
+        self.last_active = time.monotonic()
+
+    def apply_inputs(self):
+        while self.inputs:
+            self.game.apply(self.inputs.popleft())
+
+        if len(self.log) >= CHECKPOINT_EVERY:
+            self.checkpoint = Checkpoint.take(self.game)
+            self.segments.append((self.log.encode(), self.checkpoint.digest()))
+            self.log = InputLog()
+
+    def frame(self) -> Optional[dict]:
+        """Applies the queued inputs and renders the message's payload, unless that's what it shows
+
+        Pass it to `sent` once it's been sent
+        """
+        self.apply_inputs()
+        if self.game.version == self._version:
+            return None
+
+        self._version = self.game.version
+        disabled = set()
+        if self.game.hold_lock:
+            disabled.add(Actions.SWAP)
+        if not self.game.can_undo:
+            disabled.add(Actions.UNDO)
+        if not self.game.can_redo:
+            disabled.add(Actions.REDO)
+
+        embed = self.game.get_embed()
+        embed.set_footer(text=self.footer[0], icon_url=self.footer[1])
+        payload = {'embeds': [embed.to_dict()], 'components': components(self.layout, frozenset(disabled))}
+        if payload == self._shown:
+            return None
+
+        return payload
+
+    def sent(self, payload: Optional[dict]):
+        """Records what the message shows after sending a frame, None if it couldn't be sent"""
+        if payload is None:
+            self._version = None
+        else:
+            self._shown = payload
+
+    def to_record(self) -> dict:
+        return {
+            'mode': self.mode,
+            'user_id': self.user_id,
+            'channel_id': self.channel_id,
+            'layout': self.layout,
+            'footer': list(self.footer),
+            'seed': self.game.seed,
+            'undo_depth': self.game.history.undos.maxlen,
+            'start': self.game.start,
+            'checkpoint': None if self.checkpoint is None else self.checkpoint.encode(),
+            'segments': self.stored + len(self.segments),
+            'log': self.log.encode()
+        }
+
+    @staticmethod
+    def from_record(message_id: int, record: dict, config: dict, user_settings: dict) -> 'Session':
+        config = config | {'undo_depth': record['undo_depth']}
+        game = MODES[record['mode']](record['start'], config, user_settings, seed=record['seed'])
+        # Games played for less than `CHECKPOINT_EVERY` inputs (or stored before there were
+        # checkpoints) are replayed from the start
+        checkpoint = None
+        if record.get('checkpoint') is not None:
+            checkpoint = Checkpoint.decode(record['checkpoint'])
+            checkpoint.restore(game)
+
+        log = InputLog.decode(record['log'])
+        replay(game, log)
+        return Session(
+            record['mode'], game, record['user_id'], record['channel_id'], message_id, record['layout'],
+            tuple(record['footer']), log, checkpoint, record.get('segments', 0)
+        )
+
+
+class Sessions:
+    """Every open session, by message id
+
+    Ones idle for long enough are evicted, i.e. stored and dropped from memory, then rehydrated
+    from the db when they're next needed
+    """
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.active: dict[int, Session] = {}
+
+    def open(self, session: Session):
+        self.active[session.message_id] = session
+        self.store(session)
+
+    def get(self, message_id: int) -> Optional[Session]:
+        session = self.active.get(message_id)
+        if session is None:
+            record = self.bot.db.sessions.get(message_id)
+            if record is not None:
+                session = self.active[message_id] = self._rehydrate(message_id, record)
+
+        return session
+
+    def of_user(self, user_id: int) -> Optional[Session]:
+        for session in self.active.values():
+            if session.user_id == user_id:
+                return session
+
+        stored = self.bot.db.sessions.of_user(user_id)
+        if stored is None:
+            return None
+        message_id, record = stored
+        # In a cluster, games in other workers' channels are only played by those
+        if self.bot.cluster is not None and self.bot.get_channel(record['channel_id']) is None:
+            return None
+
+        return self.get(message_id)
+
+    def store(self, session: Session):
+        self.store_all([session])
+
+    def store_all(self, sessions: Iterable[Session]):
+        """Stores `sessions` over their previous records, in one transaction however many there are"""
+        records = []
+        logs = []
+        for session in sessions:
+            records.append((session.message_id, session.to_record()))
+            logs += [(session.message_id, session.stored + i, *log) for i, log in enumerate(session.segments)]
+            session.stored += len(session.segments)
+            session.segments = []
+
+        self.bot.db.sessions.store(records, logs)
+
+    def full_log(self, session: Session) -> tuple[InputLog, list[tuple[int, str]]]:
+        """Every input played on `session` since its game started, and after how many inputs each
+        checkpoint was taken with its digest
+        """
+        log = InputLog()
+        checkpoints = []
+        for encoded, digest in self._segments(session):
+            log.extend(InputLog.decode(encoded))
+            checkpoints.append((len(log), digest))
+
+        log.extend(session.log)
+        return log, checkpoints
+
+    def close(self, session: Session):
+        """Ends `session` for good, dispatching `session_end` with it"""
+        session.apply_inputs()
+        session.closed = True
+        self.active.pop(session.message_id, None)
+        # Its logs are removed along with it, but `session_end` listeners still need them
+        session.segments = self._segments(session)
+        session.stored = 0
+        self.bot.db.sessions.remove(session.message_id)
+        self.bot.dispatch('session_end', session)
+
+    def evict(self, idle: float = 0) -> int:
+        """Stores and drops every session that hasn't been played for `idle` seconds, returns how many
+        (except for ones with inputs still being shown)
+        """
+        now = time.monotonic()
+        evicted = [
+            session for session in self.active.values()
+            if now - session.last_active >= idle and not session.inputs and not session.lock.locked()
+        ]
+        self._drop(evicted)
+        return len(evicted)
+
+    def checkpoint(self) -> int:
+        """Stores and drops every session, returns how many
+
+        Inputs that are still queued are in their log already, so they're applied on rehydrating,
+        but the sessions must not be in the middle of being shown
+        """
+        sessions = list(self.active.values())
+        self._drop(sessions)
+        return len(sessions)
+
+    def _drop(self, sessions: list[Session]):
+        self.store_all(sessions)
+        # Like on `session_end`, so the zen save and leaderboard don't wait for the next autosave
+        zen = [(session.user_id, session.game.to_save()) for session in sessions if session.mode == 'zen']
+        if zen:
+            self.bot.db.zen.save_all(zen)
+        for session in sessions:
+            session.closed = True
+            del self.active[session.message_id]
+
+    def _segments(self, session: Session) -> list[tuple[str, str]]:
+        if not session.stored:
+            return session.segments
+
+        return self.bot.db.sessions.logs(session.message_id)[:session.stored] + session.segments
+
+    def _rehydrate(self, message_id: int, record: dict) -> Session:
+        user_settings = self.bot.db.settings.get(record['user_id'])
+        return Session.from_record(message_id, record, self.bot.config, user_settings)
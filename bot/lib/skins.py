@@ -0,0 +1,60 @@
+"""Skins from the config compiled into render tables shared by every game
+
+Games and renderers only keep a skin's id and look it up here when rendering, so `load` can swap
+in newly compiled skins (e.g. when the config is reloaded) all at once without touching them
+"""
+from typing import Optional
+
+# Background, I, L, J, S, Z, T, O, garbage and ghost, for skins that don't set `colors`
+DEFAULT_COLORS = (
+    0x101014, 0x31c7ef, 0xef7921, 0x5a65ad, 0x42b642, 0xef2029, 0xad4d9c, 0xf7d308, 0x6b6b6b, 0xa0a0a0
+)
+
+
+class Skin:
+    """A skin's emotes, plus every row rendered with them so far keyed by the row's cell bytes
+
+    A row is rendered with one dict lookup once it's been seen, up to `MAX_ROWS` of them, past
+    which the oldest ones are dropped. `colors` are what images (like replays) are drawn with
+    """
+    __slots__ = ('name', 'emotes', 'colors', 'rows')
+
+    MAX_ROWS = 4096
+
+    def __init__(self, name: str, emotes: list[str], colors: Optional[list[str]] = None):
+        self.name = name
+        self.emotes = tuple(emotes)
+        self.colors = DEFAULT_COLORS if colors is None else tuple(int(i.lstrip('#'), 16) for i in colors)
+        self.rows: dict[bytes, str] = {}
+
+    def row(self, cells: bytes) -> str:
+        text = self.rows.get(cells)
+        if text is None:
+            text = ''.join([self.emotes[i] for i in cells])
+            if len(self.rows) >= self.MAX_ROWS:
+                self.rows.pop(next(iter(self.rows)), None)
+
+            self.rows[cells] = text
+
+        return text
+
+
+_loaded: tuple[Optional[list], tuple[Skin, ...]] = (None, ())
+
+
+def load(config: dict):
+    """Compiles the skins in `config`, unless it's the config they were last compiled from
+
+    The new skins replace the old ones in a single assignment, so a render running meanwhile
+    uses either all old or all new skins
+    """
+    global _loaded
+    if config['skins'] is not _loaded[0]:
+        _loaded = (
+            config['skins'],
+            tuple(Skin(skin['name'], skin['pieces'], skin.get('colors')) for skin in config['skins'])
+        )
+
+
+def get(skin_id: int) -> Skin:
+    return _loaded[1][skin_id]
@@ -0,0 +1,321 @@
+from typing import Optional
+
+import numpy as np
+from numpy.typing import NDArray
+
+from bot.lib.consts import SHAPES
+from bot.lib.consts import SRS_I_KICKS
+from bot.lib.consts import SRS_KICKS
+from bot.lib.game import Actions
+from bot.lib.game import Pieces
+
+# [piece_type - 1, rotation, cell] -> (x, y)
+OFFSETS = np.array(SHAPES, dtype=np.int64)
+
+
+def _build_kicks() -> tuple[NDArray[np.int64], NDArray[np.int64]]:
+    kicks = np.zeros((7, 4, 4, 5, 2), dtype=np.int64)
+    counts = np.zeros((7, 4, 4), dtype=np.int64)
+    for t in range(7):
+        kick_table = SRS_I_KICKS if t + 1 == Pieces.I.value else SRS_KICKS
+        for previous in range(4):
+            for value in range(4):
+                if previous == value:
+                    continue
+
+                table = kick_table[previous][value]
+                kicks[t, previous, value, :len(table)] = table
+                counts[t, previous, value] = len(table)
+
+    return kicks, counts
+
+
+# [piece_type - 1, previous_rotation, rotation, kick] -> (x, y), and how many kicks each has
+KICKS, KICK_COUNTS = _build_kicks()
+
+# Score tables from `Game.lock_piece`, indexed by line clears (and padded where that'd raise)
+CLEAR_SCORES = np.array([0, 100, 300, 500, 800])
+TSPIN_SCORES = np.array([400, 800, 1200, 1600, 1600])
+TSPIN_B2B_SCORES = np.array([0, 400, 600, 800, 800])
+MINI_SCORES = np.array([100, 200, 400, 400, 400])
+MINI_B2B_SCORES = np.array([0, 100, 200, 200, 200])
+PERFECT_CLEAR_SCORES = np.array([0, 700, 900, 1200, 1200])
+
+FULL_ROW = (1 << 10) - 1
+
+
+def _bit_length(values: NDArray[np.int64]) -> NDArray[np.int64]:
+    # Exact for anything that fits in a float's mantissa, the masks here are 30 bits at most
+    return np.frexp(values.astype(np.float64))[1].astype(np.int64)
+
+
+class VectorGame:
+    """Many games stepped at once, for simulations and bots
+
+    Every attribute holds the same thing as on `Game`, stacked on the first axis, i.e.
+    `board` is `(n, 30, 10)` and `score` is `(n,)`, with the current piece split into
+    `piece_type`/`piece_x`/`piece_y`/`piece_rot` and an empty hold being 0
+
+    `step` takes one of `Actions` per game and applies them all with array operations,
+    following the same rules (and scoring) as `Game`. The only differences are that
+    `Actions.SWAP` does nothing while `hold_lock` is set, like the disabled button, and
+    `Actions.UNDO`/`Actions.REDO` do nothing, like on a plain `Game`
+
+    Like `BitBoard`, collisions are checked against bitmasks, kept in `rows` (`(n, 30)`)
+    and `columns` (`(n, 10)`), so `update_masks` has to be called after editing `board`
+    """
+    def __init__(self, n: int, seed: Optional[int] = None):
+        self.n = n
+        self.rng = np.random.default_rng(seed)
+        self.board = np.zeros((n, 30, 10), dtype=np.int8)
+        self.rows = np.zeros((n, 30), dtype=np.int64)
+        self.columns = np.zeros((n, 10), dtype=np.int64)
+        self.queue = np.zeros((n, 4), dtype=np.int8)
+        self.bag = np.zeros((n, 7), dtype=np.int8)
+        self.bag_size = np.zeros(n, dtype=np.int64)
+        self.piece_type = np.zeros(n, dtype=np.int64)
+        self.piece_x = np.zeros(n, dtype=np.int64)
+        self.piece_y = np.zeros(n, dtype=np.int64)
+        self.piece_rot = np.zeros(n, dtype=np.int64)
+        # Same as `Piece.delta.x` and `Piece.delta.rotation`
+        self.delta_x = np.zeros(n, dtype=np.int64)
+        self.delta_rot = np.zeros(n, dtype=np.int64)
+        self.score = np.zeros(n, dtype=np.int64)
+        self.previous_score = np.zeros(n, dtype=np.int64)
+        self.hold = np.zeros(n, dtype=np.int64)
+        self.hold_lock = np.zeros(n, dtype=bool)
+        self.combo = np.zeros(n, dtype=np.int64)
+        self.b2b = np.zeros(n, dtype=np.int64)
+        # Lines cleared by the last piece locked on each game
+        self.lines = np.zeros(n, dtype=np.int64)
+        self._reset(np.arange(n))
+
+    def reset(self, mask: Optional[NDArray[np.bool_]] = None):
+        self._reset(np.arange(self.n) if mask is None else np.flatnonzero(mask))
+
+    def update_masks(self, mask: Optional[NDArray[np.bool_]] = None):
+        self._update_masks(np.arange(self.n) if mask is None else np.flatnonzero(mask))
+
+    def step(self, actions: NDArray[np.integer]) -> NDArray[np.bool_]:
+        """Applies one action to each game, returns which ones locked a piece"""
+        actions = np.broadcast_to(actions, (self.n,))
+        locked = np.zeros(self.n, dtype=bool)
+        for action in np.unique(actions):
+            idx = np.flatnonzero(actions == action)
+            if action == Actions.MOVE_LEFT:
+                self._drag(idx, -1)
+            elif action == Actions.MOVE_RIGHT:
+                self._drag(idx, +1)
+            elif action == Actions.CHARGE_LEFT:
+                self._drag(idx, -10)
+            elif action == Actions.CHARGE_RIGHT:
+                self._drag(idx, +10)
+            elif action == Actions.ROTATE_CW:
+                self._rotate(idx, +1)
+            elif action == Actions.ROTATE_CCW:
+                self._rotate(idx, -1)
+            elif action == Actions.ROTATE_180:
+                self._rotate(idx, 2)
+            elif action == Actions.SOFT_DROP:
+                self._drop(idx, 5)
+                self.score[idx] += self.delta_x[idx]
+            elif action == Actions.HARD_DROP:
+                self._drop(idx, 30)
+                self.previous_score[idx] = self.score[idx]
+                self.score[idx] += self.delta_x[idx] * 2
+                self._lock(idx)
+                locked[idx] = True
+            elif action == Actions.SWAP:
+                self._swap(idx[~self.hold_lock[idx]])
+            elif action == Actions.RESET:
+                self._reset(idx)
+
+        return locked
+
+    def _cells(
+        self, idx: NDArray[np.int64], x: NDArray[np.int64], y: NDArray[np.int64], r: NDArray[np.int64]
+    ) -> tuple[NDArray[np.int64], NDArray[np.int64]]:
+        offsets = OFFSETS[self.piece_type[idx] - 1, r]
+        return x[:, None] + offsets[:, :, 0], y[:, None] + offsets[:, :, 1]
+
+    def _overlaps(
+        self, idx: NDArray[np.int64], x: NDArray[np.int64], y: NDArray[np.int64], r: NDArray[np.int64]
+    ) -> NDArray[np.bool_]:
+        cx, cy = self._cells(idx, x, y, r)
+        outside = (cx < 0) | (cx >= 30) | (cy < 0) | (cy >= 10)
+        filled = self.rows[idx[:, None], np.clip(cx, 0, 29)] >> np.clip(cy, 0, 9) & 1
+        return (outside | filled.astype(bool)).any(1)
+
+    def _drag(self, idx: NDArray[np.int64], dist: int):
+        cx, cy = self._cells(idx, self.piece_x[idx], self.piece_y[idx], self.piece_rot[idx])
+        rows = self.rows[idx[:, None], cx]
+        if dist < 0:
+            # Distance from every cell to the highest set bit to its left
+            gaps = cy - _bit_length(rows & (1 << cy) - 1)
+        else:
+            blockers = rows >> cy + 1
+            gaps = np.where(blockers != 0, _bit_length(blockers & -blockers) - 1, 9 - cy)
+
+        moves = np.clip(gaps.min(1), 0, abs(dist))
+        self.piece_y[idx] += moves if dist > 0 else -moves
+        moved = idx[moves > 0]
+        self.delta_x[moved] = 0
+        self.delta_rot[moved] = 0
+
+    def _drop(self, idx: NDArray[np.int64], height: int):
+        x, y, r = self.piece_x[idx], self.piece_y[idx], self.piece_rot[idx]
+        cx, cy = self._cells(idx, x, y, r)
+        # Distance from every cell to the lowest set bit below it on its column, or to the floor
+        blockers = self.columns[idx[:, None], cy] >> cx + 1
+        gaps = np.where(blockers != 0, _bit_length(blockers & -blockers) - 1, 29 - cx)
+        dist = np.clip(gaps.min(1), 0, height)
+
+        moved = dist > 0
+        self.piece_x[idx] += dist
+        self.delta_x[idx[moved]] = dist[moved]
+        self.delta_rot[idx[moved]] = 0
+
+    def _rotate(self, idx: NDArray[np.int64], turns: int):
+        t = self.piece_type[idx] - 1
+        previous = self.piece_rot[idx]
+        value = (previous + turns) % 4
+        x, y = self.piece_x[idx], self.piece_y[idx]
+        kick_x = np.zeros(len(idx), dtype=np.int64)
+        kick_y = np.zeros(len(idx), dtype=np.int64)
+        pending = self._overlaps(idx, x, y, value)
+        rotated = ~pending
+        for kick in range(KICKS.shape[3]):
+            pending &= kick < KICK_COUNTS[t, previous, value]
+            if not pending.any():
+                break
+
+            candidate_x = x + KICKS[t, previous, value, kick, 0]
+            candidate_y = y + KICKS[t, previous, value, kick, 1]
+            fits = pending & ~self._overlaps(idx, candidate_x, candidate_y, value)
+            kick_x[fits] = candidate_x[fits] - x[fits]
+            kick_y[fits] = candidate_y[fits] - y[fits]
+            rotated |= fits
+            pending &= ~fits
+
+        done = idx[rotated]
+        self.piece_x[done] += kick_x[rotated]
+        self.piece_y[done] += kick_y[rotated]
+        self.piece_rot[done] = value[rotated]
+        self.delta_x[done] = kick_x[rotated]
+        self.delta_rot[done] = value[rotated] - previous[rotated]
+
+    def _swap(self, idx: NDArray[np.int64]):
+        empty = self.hold[idx] == 0
+        current = self.piece_type[idx].copy()
+        new = self.hold[idx].copy()
+        if empty.any():
+            new[empty] = self._pop(idx[empty])
+
+        self.hold[idx] = current
+        self._spawn(idx, new)
+        self.hold_lock[idx] = True
+
+    def _lock(self, idx: NDArray[np.int64]):
+        t = self.piece_type[idx]
+        x, y, r = self.piece_x[idx], self.piece_y[idx], self.piece_rot[idx]
+        cx, cy = self._cells(idx, x, y, r)
+        board = self.board
+        board[idx[:, None], cx, cy] = t[:, None]
+        for cell in range(cx.shape[1]):
+            self.rows[idx, cx[:, cell]] |= 1 << cy[:, cell]
+            self.columns[idx, cy[:, cell]] |= 1 << cx[:, cell]
+
+        # T-spin corners, with the exact same edge cases as `Game.lock_piece`
+        def corner(dx: int, dy: int) -> NDArray[np.int64]:
+            return self.rows[idx, np.minimum(x + dx, 29)] >> (y + dy) % 10 & 1
+
+        c00, c20, c02, c22 = corner(0, 0), corner(2, 0), corner(0, 2), corner(2, 2)
+        conditions = [(x + 2 < 30) & (y + 2 < 10), (x + 2 > 30) & (y + 2 < 10), (x + 2 < 30) & (y + 2 > 10)]
+        corners = np.select(conditions, [c00 + c20 + c02 + c22, 2 + c00 + c02, 2 + c00 + c20], 3 + c00)
+        front = np.choose(r, [c00 & c02, c02 & c22, c20 & c22, c00 & c20]).astype(bool)
+        tspin = (t == Pieces.T.value) & (corners >= 3) & (self.delta_rot[idx] != 0)
+        mini = tspin & ~front & (self.delta_x[idx] < 2)
+
+        full = np.bitwise_and.reduce(self.columns[idx], axis=1) != 0
+        lines = np.zeros(len(idx), dtype=np.int64)
+        if full.any():
+            sub = idx[full]
+            full_rows = self.rows[sub] == FULL_ROW
+            lines[full] = full_rows.sum(1)
+            # Stable sort puts the full rows on top in order, which then get emptied
+            order = np.argsort(~full_rows, axis=1, kind='stable')
+            compacted = np.take_along_axis(board[sub], order[:, :, None], axis=1)
+            compacted[np.arange(30)[None, :] < lines[full][:, None]] = 0
+            board[sub] = compacted
+            self._update_masks(sub)
+
+        clearing = lines > 0
+        perfect_clear = clearing & ~self.rows[idx].any(1)
+
+        b2b = self.b2b[idx]
+        mini_score = MINI_SCORES[lines] + (b2b > 1) * MINI_B2B_SCORES[lines]
+        tspin_score = TSPIN_SCORES[lines] + (b2b > 1) * TSPIN_B2B_SCORES[lines]
+        score = np.where(tspin, np.where(mini, mini_score, tspin_score), CLEAR_SCORES[lines])
+        b2b = np.where(tspin | (lines == 4), b2b + 1, 0)
+        combo = np.where(clearing, self.combo[idx] + 1, 0)
+        score += (~tspin & (lines == 4) & (b2b > 1)) * 400
+        score += (combo > 1) * 50 * (combo - 1)
+        score += perfect_clear * (PERFECT_CLEAR_SCORES[lines] + (b2b > 1) * 2000)
+
+        self.score[idx] += score
+        self.b2b[idx] = b2b
+        self.combo[idx] = combo
+        self.lines[idx] = lines
+
+        top_out = idx[(cx < 10).any(1)]
+        self._reset(top_out)
+
+        self._spawn(idx, self._pop(idx))
+        self.hold_lock[idx] = False
+
+        block_out = idx[self._overlaps(idx, self.piece_x[idx], self.piece_y[idx], self.piece_rot[idx])]
+        self._reset(block_out)
+
+    def _update_masks(self, idx: NDArray[np.int64]):
+        filled = (self.board[idx] != 0).astype(np.int64)
+        self.rows[idx] = (filled << np.arange(10)).sum(2)
+        self.columns[idx] = (filled << np.arange(30)[:, None]).sum(1)
+
+    def _reset(self, idx: NDArray[np.int64]):
+        self.board[idx] = 0
+        self.rows[idx] = 0
+        self.columns[idx] = 0
+        self.bag_size[idx] = 0
+        for i in range(self.queue.shape[1]):
+            self.queue[idx, i] = self._next_piece(idx)
+
+        self._spawn(idx, self._pop(idx))
+        self.previous_score[idx] = self.score[idx]
+        self.hold[idx] = 0
+        self.hold_lock[idx] = False
+        self.combo[idx] = 0
+        self.b2b[idx] = 0
+
+    def _spawn(self, idx: NDArray[np.int64], types: NDArray[np.integer]):
+        self.piece_type[idx] = types
+        self.piece_x[idx] = 10
+        self.piece_y[idx] = 3
+        self.piece_rot[idx] = 0
+        self.delta_x[idx] = 0
+        self.delta_rot[idx] = 0
+
+    def _next_piece(self, idx: NDArray[np.int64]) -> NDArray[np.int8]:
+        empty = idx[self.bag_size[idx] == 0]
+        if len(empty):
+            pieces = np.tile(np.array([i.value for i in Pieces], dtype=np.int8), (len(empty), 1))
+            self.bag[empty] = self.rng.permuted(pieces, axis=1)
+            self.bag_size[empty] = self.bag.shape[1]
+
+        self.bag_size[idx] -= 1
+        return self.bag[idx, self.bag_size[idx]]
+
+    def _pop(self, idx: NDArray[np.int64]) -> NDArray[np.int8]:
+        piece = self.queue[idx, 0]
+        self.queue[idx, :-1] = self.queue[idx, 1:]
+        self.queue[idx, -1] = self._next_piece(idx)
+        return piece
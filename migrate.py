@@ -0,0 +1,64 @@
+import argparse
+import os
+import pathlib
+
+from tinydb import TinyDB
+from tinydb.storages import JSONStorage
+
+from bot.lib import db
+
+parser = argparse.ArgumentParser(
+    formatter_class=argparse.RawTextHelpFormatter,
+    description=(
+        'Moves everything from the db.json of older versions into a new SQLite database,\n'
+        'the leaderboard is rebuilt from the saves and db.json is left as it was'
+    ),
+    usage='python migrate.py [--json path] [--db path]'
+)
+parser.add_argument('--json', default='db.json', metavar='path')
+parser.add_argument('--db', default=db.PATH, metavar='path')
+
+
+def main():
+    args = parser.parse_args()
+    if not pathlib.Path(args.json).exists():
+        parser.error(f"{args.json} doesn't exist")
+    if pathlib.Path(args.db).exists():
+        parser.error(f'{args.db} already exists')
+
+    old = TinyDB(args.json, storage=JSONStorage, access_mode='r')
+    # Only moved into place once it's done, so a migration that fails halfway can just be run again
+    tmp_path = f'{args.db}.tmp'
+    for path in (tmp_path, f'{tmp_path}-wal', f'{tmp_path}-shm'):
+        if os.path.exists(path):
+            os.remove(path)
+
+    database = db.Database(tmp_path)
+
+    settings = old.table('settings').all()
+    for document in settings:
+        for name, value in document.items():
+            if name != 'user_id':
+                database.settings.set(document['user_id'], name, value)
+
+    saves = {i['user_id']: {k: v for k, v in i.items() if k != 'user_id'} for i in old.table('zen')}
+    database.zen.save_all(saves.items())
+    sessions = old.table('sessions').all()
+    database.sessions.store((document.doc_id, document) for document in sessions)
+    replays = sorted(old.table('replays'), key=lambda document: document.doc_id)
+    for document in replays:
+        database.replays.add(document)
+
+    # Commits everything that's still queued
+    database.close()
+    with open(tmp_path, 'rb+') as fp:
+        os.fsync(fp.fileno())
+    os.replace(tmp_path, args.db)
+    print(
+        f'Moved the settings of {len(settings)} users, {len(saves)} zen saves, {len(sessions)} open '
+        f'sessions and {len(replays)} replays to {args.db}, {args.json} can be removed now'
+    )
+
+
+if __name__ == '__main__':
+    main()